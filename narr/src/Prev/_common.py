@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+#
+# Shared helpers for the make_sop_nar_json_* scripts in this folder
+# (v3, v4, v5): JSON5 loading, reading one input file, picking columns,
+# building the per-file narration text and writing the output. v5a and v6
+# only borrow the projected readers, join_row_texts and dump_json_unclosed.
+#
+# Each script keeps its own main() since their output shapes differ. They
+# are run directly from this folder, so a plain "from _common import ..."
+# works.
+#
+import csv, json, re, functools, importlib.util
+from pathlib import Path
+import pandas as pd
+
+# orjson is optional: its C encoder is much faster than the stdlib's
+# indent=2 path (which is pure Python); without it we use json.dumps
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Arrow-backed strings when pyarrow is installed, so strip / concat in
+# join_row_texts run in Arrow's C++ kernels; pandas' own string dtype otherwise
+TEXT_DTYPE = "string[pyarrow]" if importlib.util.find_spec("pyarrow") else "string"
+
+SUPPORTED_XL = {".xlsx", ".xlsm", ".xls"}
+SUPPORTED_CSV = {".csv", ".txt"}
+
+# Excel engine: python-calamine (Rust, several times faster, also reads
+# .xls) when it is installed. Otherwise openpyxl, streaming rows in
+# read-only mode with cached cell values instead of formulas and no external
+# links; ExcelFile() takes those as engine_kwargs from pandas 2.1 on, older
+# pandas just uses its own defaults.
+if importlib.util.find_spec("python_calamine"):
+    XL_READ_KW = {"engine": "calamine"}
+else:
+    XL_READ_KW = {"engine": "openpyxl"}
+    if tuple(int(x) for x in pd.__version__.split(".")[:2] if x.isdigit()) >= (2, 1):
+        XL_READ_KW["engine_kwargs"] = {"read_only": True, "data_only": True, "keep_links": False}
+
+_JSON5_BLOCK = re.compile(r"/\*.*?\*/", re.S)
+_JSON5_LINE = re.compile(r"(?<!:)//.*?$", re.M)
+_JSON5_TRAIL = re.compile(r",\s*([}\]])")
+
+def strip_json5_comments_and_trailing_commas(text: str) -> str:
+    text = _JSON5_BLOCK.sub("", text)
+    text = _JSON5_LINE.sub("", text)
+    text = _JSON5_TRAIL.sub(r"\1", text)
+    return text
+
+def json_dumps_pretty(obj) -> str:
+    # 2-space indented, non-ASCII kept as-is -- same text either way;
+    # anything else (Path for source_file) is written as str()
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_INDENT_2).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, indent=2, default=str)
+
+def dump_json_unclosed(obj: dict, fh):
+    # json.dumps(obj, ensure_ascii=False, indent=2) written to fh chunk by
+    # chunk instead of as one string, minus the final "\n}" so the caller
+    # can add more members before closing the object itself
+    pending = []
+    for chunk in json.JSONEncoder(ensure_ascii=False, indent=2).iterencode(obj):
+        pending.append(chunk)
+        if len(pending) > 2:
+            fh.write(pending.pop(0))
+    tail = "".join(pending)
+    fh.write(tail[:tail.rindex("}")].rstrip())
+
+def load_json5_or_json(path: Path):
+    # keyed on mtime so an edited file is re-read; callers only read the result
+    return _load_json5_cached(str(path), path.stat().st_mtime_ns)
+
+@functools.lru_cache(maxsize=32)
+def _load_json5_cached(path_str: str, mtime_ns: int):
+    raw = Path(path_str).read_text(encoding="utf-8")
+    try:
+        return json.loads(raw)
+    except Exception:
+        cleaned = strip_json5_comments_and_trailing_commas(raw)
+        return json.loads(cleaned)
+
+def sniff_delimiter(path, encoding=None):
+    # Guess the CSV delimiter from the first 64 KB instead of letting
+    # read_csv parse the whole file once per candidate. None = no guess.
+    with open(path, "rb") as fh:
+        head = fh.read(65536)
+    try:
+        sample = head.decode(encoding or "utf-8", errors="replace")
+        return csv.Sniffer().sniff(sample, delimiters=",\t|;").delimiter
+    except (csv.Error, LookupError):
+        return None
+
+def read_any(path, sheet=None, encoding=None):
+    p = Path(path)
+    if p.suffix.lower() in SUPPORTED_XL:
+        # one ExcelFile handle (closed on exit) instead of read_excel's
+        # throwaway one; reusable if we ever read more than one sheet
+        with pd.ExcelFile(p, **XL_READ_KW) as xl:
+            return xl.parse(0 if sheet is None else sheet)
+    elif p.suffix.lower() in SUPPORTED_CSV:
+        return _read_csv(p, encoding)
+    else:
+        raise ValueError(f"Unsupported file type: {p.suffix}")
+
+def _read_csv(p, encoding=None, **kwargs):
+    if encoding:
+        kwargs["encoding"] = encoding
+    d = sniff_delimiter(p, encoding)
+    if d is not None:
+        try:
+            return pd.read_csv(p, delimiter=d, **kwargs)
+        except Exception:
+            pass
+    # no usable guess: fall back to trying each delimiter in turn
+    try_delims = [",", "\t", "|", ";"]
+    for d in try_delims:
+        try:
+            return pd.read_csv(p, delimiter=d, **kwargs)
+        except Exception:
+            continue
+    return pd.read_csv(p, **kwargs)
+
+def _wanted_filter(wanted):
+    # usecols predicate: header matches one of `wanted` as-is or lower-cased
+    keep = {str(w).lower() for w in wanted} | {str(w) for w in wanted}
+    return lambda c: str(c) in keep or str(c).lower() in keep
+
+def read_excel_projected(path, wanted, sheet=None):
+    # Like read_any's Excel branch, but only headers in `wanted` (matched
+    # case-insensitively) become columns; the engine still reads the whole
+    # sheet, the other cells are just never built into a DataFrame.
+    with pd.ExcelFile(path, **XL_READ_KW) as xl:
+        return xl.parse(0 if sheet is None else sheet, usecols=_wanted_filter(wanted))
+
+def read_csv_projected(path, wanted, encoding=None):
+    # CSV counterpart: sniffed delimiter, and the parser drops the unwanted
+    # columns while tokenizing instead of converting them
+    return _read_csv(Path(path), encoding, usecols=_wanted_filter(wanted))
+
+_DUP_SUFFIX = re.compile(r"\.\d+$")
+
+def peek_header(path, sheet=None, encoding=None):
+    # Cells of the first non-blank row, read without parsing the rest of the
+    # file (openpyxl read-only for Excel, one text line for CSV -- split on
+    # every candidate delimiter). None means "can't tell"; parse it instead.
+    p = Path(path)
+    suf = p.suffix.lower()
+    try:
+        if suf in SUPPORTED_XL:
+            from openpyxl import load_workbook
+            wb = load_workbook(p, read_only=True, data_only=True, keep_links=False)
+            try:
+                ws = wb.worksheets[0] if sheet is None else wb[sheet]
+                for row in ws.iter_rows(values_only=True):
+                    cells = [v for v in row if v is not None and str(v).strip()]
+                    if cells:
+                        return cells
+            finally:
+                wb.close()
+            return []
+        if suf in SUPPORTED_CSV:
+            with open(p, encoding=encoding or "utf-8-sig", errors="replace", newline="") as fh:
+                for line in fh:
+                    if line.strip():
+                        cells = []
+                        for d in ",\t|;":
+                            cells.extend(next(csv.reader([line], delimiter=d)))
+                        return cells
+            return []
+    except Exception:
+        return None
+    return None
+
+def header_may_match(header, text_cols) -> bool:
+    # Loose on purpose (strip, case, pandas' ".1" duplicate suffix): only a
+    # clear "none of these columns" lets the caller skip the full parse.
+    if header is None:
+        return True
+    seen = set()
+    for v in header:
+        s = str(v)
+        seen.add(s)
+        seen.add(s.strip().lower())
+    for name in text_cols:
+        key = name.strip().lower()
+        if name in seen or key in seen or _DUP_SUFFIX.sub("", key) in seen:
+            return True
+    return False
+
+@functools.lru_cache(maxsize=256)
+def _resolve_columns(columns: tuple, text_cols: tuple) -> tuple:
+    # input files in one glob usually share a header, so the case-insensitive
+    # lookup is built once per distinct (header, requested) pair
+    cols_lower = {str(c).lower(): c for c in columns}
+    resolved = []
+    for name in text_cols:
+        key = name.strip().lower()
+        if key in cols_lower:
+            resolved.append(cols_lower[key])
+        else:
+            if name in columns:
+                resolved.append(name)
+    return tuple(resolved)
+
+def pick_columns(df, text_cols):
+    return list(_resolve_columns(tuple(df.columns), tuple(text_cols)))
+
+def _col_to_text(s):
+    # strings, ints, bools and float64 cast straight to text and match str();
+    # anything else (dates, timedeltas, float32, ...) is boxed to Python
+    # objects first so each cell keeps its full str() form
+    if s.dtype.kind in "biuOT" or s.dtype == "float64" or isinstance(s.dtype, pd.StringDtype):
+        return s.astype(TEXT_DTYPE)
+    return s.astype(object).astype(TEXT_DTYPE)
+
+def join_row_texts(df, cols, sep=" — "):
+    # Column-wise instead of iterrows(): str() + strip every cell, treat
+    # blanks as missing, then join the non-missing cells of each row with sep.
+    # Rows with nothing left are dropped here, so callers don't need a
+    # separate dropna(how="all") pass (and copy) over the whole frame.
+    sub = df.loc[:, cols].apply(lambda s: _col_to_text(s).str.strip())
+    sub = sub.mask(sub == "")
+    joined = sub.iloc[:, 0]
+    for i in range(1, sub.shape[1]):
+        col = sub.iloc[:, i]
+        joined = (joined + sep + col).fillna(joined).fillna(col)
+    return joined.dropna().tolist()
+
+def build_filelevel_text(df, cols, sep=" — ", join_style="bullets"):
+    row_texts = join_row_texts(df, cols, sep)
+    if not row_texts:
+        return "", 0
+    if join_style == "paragraph":
+        return "  ".join(row_texts), len(row_texts)
+    return "- " + "\n- ".join(row_texts), len(row_texts)
+
+def json5_dump_with_header(obj: dict, path: Path, header_lines: list[str]):
+    body = json_dumps_pretty(obj)
+    header = "\n".join(f"// {line}" for line in header_lines)
+    text = f"{header}\n{body}\n"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
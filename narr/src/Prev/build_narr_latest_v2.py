@@ -1,22 +1,26 @@
 #!/usr/bin/env python3
-import argparse, json, csv, re, os
-from datetime import datetime, timezone, timedelta
-
-def bullets_to_paragraph(joined_text: str) -> str:
-    # Take bullet-y text like "- Do thing\n- Next thing" and flatten it
-    lines = []
-    for line in joined_text.splitlines():
-        line = line.strip()
-        # strip common bullet markers
-        line = re.sub(r'^[-•]\s*', '', line)
-        if line:
-            lines.append(line)
-    para = " ".join(lines)
-    # soften "/" to space (because we don't want slash in narration)
-    para = para.replace("/", " ")
-    # collapse whitespace
-    para = re.sub(r"\s+", " ", para).strip()
-    return para
+import argparse, json, os
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+# shared helpers live in narr_text.py next to this script; v2 keeps the
+# original sentence-split "5th grade" voice
+from narr_text import (
+    bullets_to_paragraph,
+    normalize_whitespace,
+    simplify_sentences_for_grade5 as simplify_for_grade5,
+    serialize_rows,
+    same_as_on_disk,
+    write_payload,
+)
+
+# the only keys build_narr_latest reads; every other key (inputs, static_meta,
+# columns_used, ...) is dropped as its object is decoded, so the parsed tree
+# holds just the files list and its text
+_KEEP_KEYS = frozenset(("files", "source_file", "joined_text"))
+
+def _keep_needed_keys(pairs):
+    return {k: v for k, v in pairs if k in _KEEP_KEYS}
 
 def first_bullet_title(joined_text: str) -> str:
     # Use first non-empty bullet line as Source_Title
@@ -24,51 +28,30 @@ def first_bullet_title(joined_text: str) -> str:
         line = line.strip()
         if not line:
             continue
-        line = re.sub(r'^[-•]\s*', '', line)
+        if line[:1] in ("-", "•"):
+            line = line[1:]
         return line.strip()
     return ""
 
-def normalize_whitespace(txt: str) -> str:
-    # "Grade 8" placeholder: just make it one smooth readable paragraph
-    txt = txt.strip()
-    txt = re.sub(r"\s+", " ", txt)
-    return txt
-
-def simplify_for_grade5(txt: str) -> str:
-    # "Grade 5" placeholder:
-    # break on sentence-ish boundaries, cap ~25 words per sentence,
-    # then stitch back together as short sentences.
-    parts = re.split(r"[.!?]+", txt)
-    simple_bits = []
-    for p in parts:
-        p = p.strip()
-        if not p:
-            continue
-        words = p.split()
-        short_words = words[:25]  # cap length
-        simple_bits.append(" ".join(short_words))
-    out = ". ".join(simple_bits).strip()
-    if out:
-        out += "."
-    return out
-
 def build_narr_latest(data: dict, sop_name: str):
     """
     data is the parsed *_narr_files.json[5] with a top-level "files" list.
     sop_name is "SRO", "Warranty", etc.
-    Returns a list of row dicts in final _narr_latest format.
+    Returns a list of row tuples in final _narr_latest (FIELDNAMES) order.
     """
     files_list = data.get("files", [])
 
     rows = []
     all_step_narr_in = []
+    all_step_out_simple = []
 
     # 1. Build P1..Pn
     for idx, fobj in enumerate(files_list, start=1):
         opm_step = f"P{idx}"
 
         src_file_full = (fobj.get("source_file","") or "").strip()
-        src_file_base = os.path.basename(src_file_full)
+        # == os.path.basename on POSIX, minus the os.path dispatch
+        src_file_base = src_file_full.rpartition("/")[2]
 
         joined_text = (fobj.get("joined_text","") or "").strip()
 
@@ -82,59 +65,47 @@ def build_narr_latest(data: dict, sop_name: str):
         out_8 = normalize_whitespace(step_in)
         out_5 = simplify_for_grade5(step_in)
 
-        row = {
-            "OPM_Step": opm_step,
-            "Source_File": src_file_base,
-            "Source_Title": title_guess,
-            "Step_narr_in": step_in,
-            "Step_narr_m_in": "",              # BLANK for normal P-rows
-            "Step_narr_out": out_8,
-            "Step_narr_out_simple": out_5,
-            "Step_narr_m_out": "",
-            "Step_narr_m_out_simple": "",
-        }
+        row = (
+            opm_step,       # OPM_Step
+            src_file_base,  # Source_File
+            title_guess,    # Source_Title
+            step_in,        # Step_narr_in
+            "",             # Step_narr_m_in -- BLANK for normal P-rows
+            out_8,          # Step_narr_out
+            out_5,          # Step_narr_out_simple
+            "",             # Step_narr_m_out
+            "",             # Step_narr_m_out_simple
+        )
         rows.append(row)
 
         if step_in:
             all_step_narr_in.append(step_in)
+        if out_5:
+            all_step_out_simple.append(out_5)
 
     # 2. Build PM row
-    mega = " ".join(all_step_narr_in).strip()
-    mega = re.sub(r"\s+", " ", mega)
-
-    pm_row = {
-        "OPM_Step": "PM",
-        "Source_File": "",
-        "Source_Title": "Process Overview",
-        "Step_narr_in": "",           # MUST stay empty for PM
-        "Step_narr_m_in": mega,       # roll-up of all P Step_narr_in text
-        "Step_narr_out": "",
-        "Step_narr_out_simple": "",
-        "Step_narr_m_out": normalize_whitespace(mega),
-        "Step_narr_m_out_simple": simplify_for_grade5(mega),
-    }
+    # each Step_narr_in is already whitespace-collapsed by bullets_to_paragraph,
+    # so a plain join is already normalized
+    mega = " ".join(all_step_narr_in)
+    # the 5th grade roll-up reuses each P row's (already "."-terminated)
+    # simple text instead of re-simplifying the whole mega string
+    mega_simple = " ".join(all_step_out_simple)
+
+    pm_row = (
+        "PM",                       # OPM_Step
+        "",                         # Source_File
+        "Process Overview",         # Source_Title
+        "",                         # Step_narr_in -- MUST stay empty for PM
+        mega,                       # Step_narr_m_in -- roll-up of all P Step_narr_in text
+        "",                         # Step_narr_out
+        "",                         # Step_narr_out_simple
+        mega,                       # Step_narr_m_out
+        mega_simple,                # Step_narr_m_out_simple
+    )
     rows.append(pm_row)
 
     return rows
 
-def write_csv(rows, out_csv_path):
-    fieldnames = [
-        "OPM_Step",
-        "Source_File",
-        "Source_Title",
-        "Step_narr_in",
-        "Step_narr_m_in",
-        "Step_narr_out",
-        "Step_narr_out_simple",
-        "Step_narr_m_out",
-        "Step_narr_m_out_simple",
-    ]
-    with open(out_csv_path, "w", encoding="utf-8", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames)
-        w.writeheader()
-        for r in rows:
-            w.writerow(r)
-
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--json5-in", required=True,
@@ -147,21 +118,29 @@ def main():
 
     # load narration summary json/json5
     with open(args.json5_in, "r", encoding="utf-8") as f:
-        narr_data = json.load(f)
+        narr_data = json.load(f, object_pairs_hook=_keep_needed_keys)
 
     # build rows
     rows = build_narr_latest(narr_data, args.sop)
 
-    # timestamp in Eastern-ish (we'll approximate with UTC-4 unless you add zoneinfo)
-    now_est = datetime.utcnow() - timedelta(hours=4)
+    # timestamp in Eastern time (zoneinfo handles EST/EDT)
+    now_est = datetime.now(ZoneInfo("America/New_York"))
     ts = now_est.strftime("%m%d%y_%H%M")
 
     os.makedirs(args.out_dir, exist_ok=True)
     out_ts = os.path.join(args.out_dir, f"{args.sop}_narr_latest_{ts}.csv")
     out_latest = os.path.join(args.out_dir, f"{args.sop}_narr_latest.csv")
 
-    write_csv(rows, out_ts)
-    write_csv(rows, out_latest)
+    # serialize once, write the same text to both files -- unless the
+    # current *_narr_latest.csv already has exactly this content
+    payload = serialize_rows(rows)
+    if same_as_on_disk(payload, out_latest):
+        print(f"Unchanged: {out_latest} (no new files written)")
+        print(f"Rows: {len(rows)} (including PM)")
+        return
+
+    for out_path in (out_ts, out_latest):
+        write_payload(payload, out_path)
 
     print(f"Wrote {out_ts}")
     print(f"Wrote {out_latest}")
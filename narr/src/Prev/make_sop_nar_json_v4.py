@@ -1,81 +1,78 @@
 #!/usr/bin/env python3
-import argparse, json, glob, re, sys
+import argparse, glob, sys, functools
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-import pandas as pd
 
-SUPPORTED_XL = {".xlsx", ".xlsm", ".xls"}
-SUPPORTED_CSV = {".csv", ".txt"}
+# shared readers / text builders live in _common.py next to this script
+from _common import (
+    load_json5_or_json,
+    read_any,
+    peek_header,
+    header_may_match,
+    pick_columns,
+    build_filelevel_text,
+    json5_dump_with_header,
+)
+
+def process_file(f, args, requested_cols, static_files):
+    # One input file -> its file-level entry, or None when the file is
+    # skipped. No shared state, so main() can run these in worker processes.
+    pf = Path(f)
+    pf_name = pf.name
+    per_file = static_files.get(pf_name, {}) if isinstance(static_files, dict) else {}
+    cols_override = per_file.get("columns_used")
+    if cols_override and isinstance(cols_override, list):
+        wanted = cols_override
+    else:
+        wanted = requested_cols
 
-def strip_json5_comments_and_trailing_commas(text: str) -> str:
-    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
-    text = re.sub(r"(?<!:)//.*?$", "", text, flags=re.M)
-    text = re.sub(r",\s*([}\]])", r"\1", text)
-    return text
+    # header peek first: a file with none of the wanted columns is skipped
+    # without paying for a full parse
+    if not header_may_match(peek_header(f, args.sheet, args.encoding), wanted):
+        print(f"[INFO] No requested columns present in {f}; skipping.")
+        return None
 
-def load_json5_or_json(path: Path):
-    raw = path.read_text(encoding="utf-8")
     try:
-        return json.loads(raw)
-    except Exception:
-        cleaned = strip_json5_comments_and_trailing_commas(raw)
-        return json.loads(cleaned)
-
-def read_any(path, sheet=None, encoding=None):
-    p = Path(path)
-    if p.suffix.lower() in SUPPORTED_XL:
-        if sheet is None:
-            return pd.read_excel(p, engine="openpyxl")
-        else:
-            return pd.read_excel(p, sheet_name=sheet, engine="openpyxl")
-    elif p.suffix.lower() in SUPPORTED_CSV:
-        kwargs = {}
-        if encoding:
-            kwargs["encoding"] = encoding
-        try_delims = [",", "\t", "|", ";"]
-        for d in try_delims:
-            try:
-                return pd.read_csv(p, delimiter=d, **kwargs)
-            except Exception:
-                continue
-        return pd.read_csv(p, **kwargs)
+        df = read_any(f, sheet=args.sheet, encoding=args.encoding)
+    except Exception as e:
+        print(f"[WARN] Skipping {f}: {e}")
+        return None
+
+    cols = pick_columns(df, wanted)
+
+    if not cols:
+        print(f"[INFO] No requested columns present in {f}; skipping.")
+        return None
+
+    joined_text, used_rows = build_filelevel_text(df, cols, sep=args.sep, join_style=args.join_style)
+
+    override_text = per_file.get("override_text")
+    append_text = per_file.get("append_text")
+
+    if isinstance(override_text, str) and override_text.strip():
+        final_text = override_text.strip()
     else:
-        raise ValueError(f"Unsupported file type: {p.suffix}")
-
-def pick_columns(df, text_cols):
-    cols_lower = {str(c).lower(): c for c in df.columns}
-    resolved = []
-    for name in text_cols:
-        key = name.strip().lower()
-        if key in cols_lower:
-            resolved.append(cols_lower[key])
-        else:
-            if name in df.columns:
-                resolved.append(name)
-    return resolved
-
-def build_filelevel_text(df, cols, sep=" — ", join_style="bullets"):
-    row_texts = []
-    for _, row in df.iterrows():
-        bits = []
-        for c in cols:
-            val = row.get(c)
-            if pd.notna(val) and str(val).strip():
-                bits.append(str(val).strip())
-        if bits:
-            row_texts.append(sep.join(bits))
-    if not row_texts:
-        return "", 0
-    if join_style == "paragraph":
-        return "  ".join(row_texts), len(row_texts)
-    return "\n".join(f"- {t}" for t in row_texts), len(row_texts)
-
-def json5_dump_with_header(obj: dict, path: Path, header_lines: list[str]):
-    body = json.dumps(obj, ensure_ascii=False, indent=2)
-    header = "\n".join(f"// {line}" for line in header_lines)
-    text = f"{header}\n{body}\n"
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(text, encoding="utf-8")
+        final_text = joined_text
+        if isinstance(append_text, str) and append_text.strip():
+            if final_text and not final_text.endswith("\n"):
+                final_text = final_text + "\n"
+            final_text = final_text + append_text.strip()
+
+    # Pass-through per-file meta (excluding control keys)
+    extra_meta = {}
+    for k, v in per_file.items():
+        if k not in {"columns_used", "override_text", "append_text"}:
+            extra_meta[k] = v
+
+    return {
+        "source_file": pf,
+        "sheet": args.sheet if args.sheet is not None else "default",
+        "row_count_used": used_rows,
+        "columns_used": cols,
+        "joined_text": final_text,
+        "static_meta": extra_meta if extra_meta else None
+    }
 
 def main(argv):
     ap = argparse.ArgumentParser(description="Emit a single SOP-level .json5 with aggregated narration and inline static inserts.")
@@ -95,10 +92,10 @@ def main(argv):
 
     # Collect files
     globs = [g.strip() for g in args.inputs.split(",") if g.strip()]
-    files = []
+    files = set()
     for g in globs:
-        files.extend(glob.glob(g, recursive=True))
-    files = sorted(set(files))
+        files.update(glob.iglob(g, recursive=True))
+    files = sorted(files)
     if not files:
         print(f"[ERROR] No files matched any glob: {args.inputs}")
         sys.exit(2)
@@ -125,55 +122,12 @@ def main(argv):
     static_files = static.get("files", {}) if isinstance(static, dict) else {}
 
     # Aggregate
-    results = []
-    for f in files:
-        try:
-            df = read_any(f, sheet=args.sheet, encoding=args.encoding)
-        except Exception as e:
-            print(f"[WARN] Skipping {f}: {e}")
-            continue
-
-        df = df.dropna(how="all")
-
-        per_file = static_files.get(Path(f).name, {}) if isinstance(static_files, dict) else {}
-        cols_override = per_file.get("columns_used")
-        if cols_override and isinstance(cols_override, list):
-            cols = pick_columns(df, cols_override)
-        else:
-            cols = pick_columns(df, requested_cols)
-
-        if not cols:
-            print(f"[INFO] No requested columns present in {f}; skipping.")
-            continue
-
-        joined_text, used_rows = build_filelevel_text(df, cols, sep=args.sep, join_style=args.join_style)
-
-        override_text = per_file.get("override_text")
-        append_text = per_file.get("append_text")
-
-        if isinstance(override_text, str) and override_text.strip():
-            final_text = override_text.strip()
-        else:
-            final_text = joined_text
-            if isinstance(append_text, str) and append_text.strip():
-                if final_text and not final_text.endswith("\n"):
-                    final_text = final_text + "\n"
-                final_text = final_text + append_text.strip()
-
-        # Pass-through per-file meta (excluding control keys)
-        extra_meta = {}
-        for k, v in per_file.items():
-            if k not in {"columns_used", "override_text", "append_text"}:
-                extra_meta[k] = v
-
-        results.append({
-            "source_file": str(Path(f)),
-            "sheet": args.sheet if args.sheet is not None else "default",
-            "row_count_used": int(used_rows),
-            "columns_used": cols,
-            "joined_text": final_text,
-            "static_meta": extra_meta if extra_meta else None
-        })
+    # files are independent and parsing is CPU-bound, so spread them over
+    # worker processes; map() hands results back in the sorted file order
+    work = functools.partial(process_file, args=args, requested_cols=requested_cols,
+                             static_files=static_files)
+    with ProcessPoolExecutor() as ex:
+        results = [r for r in ex.map(work, files, chunksize=4) if r is not None]
 
     payload = {
         "sop": args.sop,
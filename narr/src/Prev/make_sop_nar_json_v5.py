@@ -1,11 +1,20 @@
 #!/usr/bin/env python3
-import argparse, json, glob, re, sys
+import argparse, glob, sys, functools
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-import pandas as pd
 
-SUPPORTED_XL = {".xlsx", ".xlsm", ".xls"}
-SUPPORTED_CSV = {".csv", ".txt"}
+# shared readers / text builders live in _common.py next to this script
+from _common import (
+    SUPPORTED_XL,
+    SUPPORTED_CSV,
+    read_any,
+    peek_header,
+    header_may_match,
+    pick_columns,
+    build_filelevel_text,
+    json_dumps_pretty,
+)
 
 DO_NOT_EDIT_START = "// ===== BEGIN DEFAULT NARR CONFIG (do not edit) ====="
 DO_NOT_EDIT_END   = "// ===== END DEFAULT NARR CONFIG ====="
@@ -31,122 +40,56 @@ DEFAULT_LOGGING = """{
   qa_filename_suffix: "_QA.txt"
 }"""
 
-def strip_json5_comments_and_trailing_commas(text: str) -> str:
-    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
-    text = re.sub(r"(?<!:)//.*?$", "", text, flags=re.M)
-    text = re.sub(r",\s*([}\]])", r"\1", text)
-    return text
-
-def json5_dump_with_header(obj: dict, path: Path, header_lines: list[str]):
-    body = json.dumps(obj, ensure_ascii=False, indent=2)
-    header = "\n".join(f"// {line}" for line in header_lines)
-    text = f"{header}\n{body}\n"
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(text, encoding="utf-8")
-
-def read_any(path, sheet=None, encoding=None):
-    p = Path(path)
-    if p.suffix.lower() in SUPPORTED_XL:
-        if sheet is None:
-            return pd.read_excel(p, engine="openpyxl")
-        else:
-            return pd.read_excel(p, sheet_name=sheet, engine="openpyxl")
-    elif p.suffix.lower() in SUPPORTED_CSV:
-        kwargs = {}
-        if encoding:
-            kwargs["encoding"] = encoding
-        try_delims = [",", "\t", "|", ";"]
-        for d in try_delims:
-            try:
-                return pd.read_csv(p, delimiter=d, **kwargs)
-            except Exception:
-                continue
-        return pd.read_csv(p, **kwargs)
-    else:
-        raise ValueError(f"Unsupported file type: {p.suffix}")
-
-def pick_columns(df, text_cols):
-    cols_lower = {str(c).lower(): c for c in df.columns}
-    resolved = []
-    for name in text_cols:
-        key = name.strip().lower()
-        if key in cols_lower:
-            resolved.append(cols_lower[key])
-        else:
-            if name in df.columns:
-                resolved.append(name)
-    return resolved
-
-def build_filelevel_text(df, cols, sep=" — ", join_style="bullets"):
-    row_texts = []
-    for _, row in df.iterrows():
-        bits = []
-        for c in cols:
-            val = row.get(c)
-            if pd.notna(val) and str(val).strip():
-                bits.append(str(val).strip())
-        if bits:
-            row_texts.append(sep.join(bits))
-    if not row_texts:
-        return "", 0
-    if join_style == "paragraph":
-        return "  ".join(row_texts), len(row_texts)
-    return "\n".join(f"- {t}" for t in row_texts), len(row_texts)
-
-def insert_or_replace_top_level(json5_text: str, key: str, body: str) -> str:
-    # Replace existing 'key: { ... }' or mark for append by returning unchanged.
-    pattern = re.compile(
-        r'(^|\n)\s*' + re.escape(key) + r'\s*:\s*\{.*?\}\s*(,)?',
-        flags=re.S
-    )
-    if pattern.search(json5_text):
-        new_block = f"\n  {key}: {body},\n"
-        return pattern.sub(lambda m: new_block, json5_text)
-    return json5_text  # not found; we'll append later
-
-def ensure_trailing_comma_before_closing_brace(text: str) -> str:
-    idx = text.rfind('}')
-    if idx == -1:
-        raise ValueError("Output doesn't look like a JSON5 object (no closing }).")
-    prefix = text[:idx].rstrip()
-    suffix = text[idx:]
-    if not prefix.endswith(','):
-        prefix += ','
-    return prefix + "\n" + suffix
-
-def append_defaults_guarded(text: str) -> str:
-    # First, attempt to replace existing blocks if present.
-    text2 = insert_or_replace_top_level(text, "summarize", DEFAULT_SUMMARIZE)
-    text2 = insert_or_replace_top_level(text2, "output", DEFAULT_OUTPUT)
-    text2 = insert_or_replace_top_level(text2, "logging", DEFAULT_LOGGING)
-
-    if text2 != text:
-        # Blocks were replaced; ensure guard comments exist around them.
-        # For simplicity, we append guards once at the end.
-        text2 = ensure_trailing_comma_before_closing_brace(text2)
-        guard = (
-            f"\n{DO_NOT_EDIT_START}\n"
-            f"  // The following default blocks may be replaced by the generator; avoid manual edits.\n"
-            f"  summarize: {DEFAULT_SUMMARIZE},\n"
-            f"  output: {DEFAULT_OUTPUT},\n"
-            f"  logging: {DEFAULT_LOGGING}\n"
-            f"{DO_NOT_EDIT_END}\n"
-        )
-        last = text2.rfind('}')
-        return text2[:last] + guard + text2[last:]
-
-    # No existing keys found; append a fresh guarded section.
-    text3 = ensure_trailing_comma_before_closing_brace(text)
-    guard = (
-        f"\n{DO_NOT_EDIT_START}\n"
-        f"  // The following default blocks were added by the generator; do not modify.\n"
-        f"  summarize: {DEFAULT_SUMMARIZE},\n"
-        f"  output: {DEFAULT_OUTPUT},\n"
-        f"  logging: {DEFAULT_LOGGING}\n"
-        f"{DO_NOT_EDIT_END}\n"
-    )
-    last = text3.rfind('}')
-    return text3[:last] + guard + text3[last:]
+# constant tail spliced in before the payload's closing brace
+DEFAULT_GUARD_BLOCK = (
+    f"\n{DO_NOT_EDIT_START}\n"
+    f"  // The following default blocks were added by the generator; do not modify.\n"
+    f"  summarize: {DEFAULT_SUMMARIZE},\n"
+    f"  output: {DEFAULT_OUTPUT},\n"
+    f"  logging: {DEFAULT_LOGGING}\n"
+    f"{DO_NOT_EDIT_END}\n"
+)
+
+def process_file(f, args, requested_cols):
+    # One input file -> its file-level entry, or None when the file is
+    # skipped. No shared state, so main() can run these in worker processes.
+    pf = Path(f)
+    suf = pf.suffix.lower()
+    if suf not in SUPPORTED_XL and suf not in SUPPORTED_CSV:
+        return None
+
+    # header peek first: a file with none of the requested columns is
+    # skipped without paying for a full parse
+    if not header_may_match(peek_header(f, args.sheet, args.encoding), requested_cols):
+        print(f"[INFO] No requested columns present in {f}; skipping.")
+        return None
+
+    try:
+        df = read_any(f, sheet=args.sheet, encoding=args.encoding)
+    except Exception as e:
+        print(f"[WARN] Skipping {f}: {e}")
+        return None
+
+    # Pick columns (case-insensitive)
+    cols = pick_columns(df, requested_cols)
+
+    if not cols:
+        print(f"[INFO] No requested columns present in {f}; skipping.")
+        return None
+
+    # Build text
+    joined, used_rows = build_filelevel_text(df, cols, sep=args.sep, join_style=args.join_style)
+
+    if not used_rows:
+        return None
+
+    return {
+        "source_file": pf,
+        "sheet": args.sheet if args.sheet is not None else "default",
+        "row_count_used": used_rows,
+        "columns_used": cols,
+        "joined_text": joined
+    }
 
 def main(argv):
     ap = argparse.ArgumentParser(description="Emit a single SOP-level .json5 with aggregated narration and built-in defaults.")
@@ -164,10 +107,10 @@ def main(argv):
         print(f"[WARN] Output does not end with .json5; writing JSON5 anyway: {args.out}")
 
     globs = [g.strip() for g in args.inputs.split(",") if g.strip()]
-    files = []
+    files = set()
     for g in globs:
-        files.extend(glob.glob(g, recursive=True))
-    files = sorted(set(files))
+        files.update(glob.iglob(g, recursive=True))
+    files = sorted(files)
     if not files:
         print(f"[ERROR] No files matched any glob: {args.inputs}")
         sys.exit(2)
@@ -177,73 +120,11 @@ def main(argv):
         print("[ERROR] --text-cols must list at least one column")
         sys.exit(2)
 
-    results = []
-    for f in files:
-        try:
-            if Path(f).suffix.lower() in SUPPORTED_XL:
-                df = pd.read_excel(f, engine="openpyxl") if args.sheet is None else pd.read_excel(f, sheet_name=args.sheet, engine="openpyxl")
-            elif Path(f).suffix.lower() in SUPPORTED_CSV:
-                df = None
-                import pandas as pd  # ensure imported
-                kwargs = {}
-                if args.encoding:
-                    kwargs["encoding"] = args.encoding
-                for d in [",", "\t", "|", ";"]:
-                    try:
-                        df = pd.read_csv(f, delimiter=d, **kwargs)
-                        break
-                    except Exception:
-                        continue
-                if df is None:
-                    df = pd.read_csv(f, **kwargs)
-            else:
-                continue
-        except Exception as e:
-            print(f"[WARN] Skipping {f}: {e}")
-            continue
-
-        df = df.dropna(how="all")
-
-        # Pick columns (case-insensitive)
-        cols_lower = {str(c).lower(): c for c in df.columns}
-        cols = []
-        for name in requested_cols:
-            key = name.strip().lower()
-            if key in cols_lower:
-                cols.append(cols_lower[key])
-            elif name in df.columns:
-                cols.append(name)
-
-        if not cols:
-            print(f"[INFO] No requested columns present in {f}; skipping.")
-            continue
-
-        # Build text
-        row_texts = []
-        for _, row in df.iterrows():
-            bits = []
-            for c in cols:
-                val = row.get(c)
-                if pd.notna(val) and str(val).strip():
-                    bits.append(str(val).strip())
-            if bits:
-                row_texts.append((args.sep).join(bits))
-
-        if not row_texts:
-            continue
-
-        if args.join_style == "paragraph":
-            joined = "  ".join(row_texts)
-        else:
-            joined = "\n".join(f"- {t}" for t in row_texts)
-
-        results.append({
-            "source_file": str(Path(f)),
-            "sheet": args.sheet if args.sheet is not None else "default",
-            "row_count_used": len(row_texts),
-            "columns_used": cols,
-            "joined_text": joined
-        })
+    # files are independent and parsing is CPU-bound, so spread them over
+    # worker processes; map() hands results back in the sorted file order
+    work = functools.partial(process_file, args=args, requested_cols=requested_cols)
+    with ProcessPoolExecutor() as ex:
+        results = [r for r in ex.map(work, files, chunksize=4) if r is not None]
 
     payload = {
         "sop": args.sop,
@@ -260,11 +141,11 @@ def main(argv):
         "This file is generated. You may add comments, but avoid editing the default config section below.",
     ]
     # Write base JSON5
-    json_body = json.dumps(payload, ensure_ascii=False, indent=2)
+    json_body = json_dumps_pretty(payload)
     header_text = "\n".join(f"// {line}" for line in header)
-    text = f"{header_text}\n{json_body}\n"
-    # Append or replace defaults with guard comments
-    text = append_defaults_guarded(text)
+    # Append defaults with guard comments: json_body ends with the object's
+    # closing "}", so cut it, add a comma + the guarded block, and re-close
+    text = f"{header_text}\n{json_body[:-1].rstrip()},\n{DEFAULT_GUARD_BLOCK}}}\n"
     outp.parent.mkdir(parents=True, exist_ok=True)
     outp.write_text(text, encoding="utf-8")
     print(f"[OK] Wrote {len(results)} file-level entries to {outp}")
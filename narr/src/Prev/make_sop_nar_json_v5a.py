@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
-import argparse, json, glob, re, sys
+import argparse, glob, sys, functools
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-import pandas as pd  # keep ONE import at module level
+
+# projected readers, column-wise row join and streamed JSON writer shared
+# with v3/v4/v5 (_common.py next to this script)
+from _common import read_excel_projected, read_csv_projected, join_row_texts, dump_json_unclosed
 
 SUPPORTED_XL = {".xlsx", ".xlsm", ".xls"}
 SUPPORTED_CSV = {".csv", ".txt"}
@@ -31,50 +35,64 @@ DEFAULT_LOGGING = """{
   qa_filename_suffix: "_QA.txt"
 }"""
 
+# constant tail spliced in before the payload's closing brace
+DEFAULT_GUARD_BLOCK = (
+    f"\n{DO_NOT_EDIT_START}\n"
+    f"  // The following default blocks are managed by the generator.\n"
+    f"  summarize: {DEFAULT_SUMMARIZE},\n"
+    f"  output: {DEFAULT_OUTPUT},\n"
+    f"  logging: {DEFAULT_LOGGING}\n"
+    f"{DO_NOT_EDIT_END}\n"
+)
+
 def json5_header(lines):
     return "\n".join(f"// {ln}" for ln in lines)
 
-def insert_or_replace_top_level(json5_text: str, key: str, body: str) -> str:
-    pattern = re.compile(r'(^|\n)\s*' + re.escape(key) + r'\s*:\s*\{.*?\}\s*(,)?', flags=re.S)
-    if pattern.search(json5_text):
-        return pattern.sub(lambda m: f"\n  {key}: {body},\n", json5_text)
-    return json5_text
-
-def ensure_trailing_comma_before_closing_brace(text: str) -> str:
-    idx = text.rfind('}')
-    if idx == -1:
-        raise ValueError("Output doesn't look like a JSON5 object (no closing }).")
-    prefix, suffix = text[:idx].rstrip(), text[idx:]
-    if not prefix.endswith(','):
-        prefix += ','
-    return prefix + "\n" + suffix
-
-def append_defaults_guarded(text: str) -> str:
-    changed = False
-    t = insert_or_replace_top_level(text, "summarize", DEFAULT_SUMMARIZE)
-    changed |= (t != text); text = t
-    t = insert_or_replace_top_level(text, "output", DEFAULT_OUTPUT)
-    changed |= (t != text); text = t
-    t = insert_or_replace_top_level(text, "logging", DEFAULT_LOGGING)
-    changed |= (t != text); text = t
-
-    guard = (
-        f"\n{DO_NOT_EDIT_START}\n"
-        f"  // The following default blocks are managed by the generator.\n"
-        f"  summarize: {DEFAULT_SUMMARIZE},\n"
-        f"  output: {DEFAULT_OUTPUT},\n"
-        f"  logging: {DEFAULT_LOGGING}\n"
-        f"{DO_NOT_EDIT_END}\n"
-    )
-
-    if changed:
-        text = ensure_trailing_comma_before_closing_brace(text)
-        last = text.rfind('}')
-        return text[:last] + guard + text[last:]
-    else:
-        text = ensure_trailing_comma_before_closing_brace(text)
-        last = text.rfind('}')
-        return text[:last] + guard + text[last:]
+def process_file(f, args, requested_cols, requested_lower):
+    # One input file -> its file-level entry, or None when the file is
+    # skipped. No shared state, so main() can run these in worker processes.
+    try:
+        suf = Path(f).suffix.lower()
+        if suf in {".xlsx", ".xlsm", ".xls"}:
+            # only the requested text columns are materialized
+            df = read_excel_projected(f, requested_cols, args.sheet)
+        elif suf in {".csv", ".txt"}:
+            # delimiter sniffed from the head of the file, then parsed once
+            df = read_csv_projected(f, requested_cols, args.encoding)
+        else:
+            return None
+    except Exception as e:
+        print(f"[WARN] Skipping {f}: {e}")
+        return None
+
+    # resolve columns case-insensitively
+    lower = dict(zip(df.columns.astype(str).str.lower(), df.columns))
+    cols = []
+    for name, key in zip(requested_cols, requested_lower):
+        if key in lower:
+            cols.append(lower[key])
+        elif name in df.columns:
+            cols.append(name)
+
+    if not cols:
+        print(f"[INFO] No requested columns present in {f}; skipping.")
+        return None
+
+    # combine per row (column-wise, blank cells skipped)
+    row_texts = join_row_texts(df, cols, args.sep)
+
+    if not row_texts:
+        return None
+
+    joined = "  ".join(row_texts) if args.join_style == "paragraph" else "\n".join(f"- {t}" for t in row_texts)
+
+    return {
+        "source_file": str(Path(f)),
+        "sheet": args.sheet if args.sheet is not None else "default",
+        "row_count_used": len(row_texts),
+        "columns_used": cols,
+        "joined_text": joined
+    }
 
 def main(argv):
     ap = argparse.ArgumentParser(description="Emit a single SOP-level .json5 with aggregated narration and built-in defaults.")
@@ -92,7 +110,10 @@ def main(argv):
         print(f"[WARN] Output does not end with .json5; writing JSON5 anyway: {args.out}")
 
     globs = [g.strip() for g in args.inputs.split(",") if g.strip()]
-    files = sorted({f for g in globs for f in glob.glob(g, recursive=True)})
+    files = set()
+    for g in globs:
+        files.update(glob.iglob(g, recursive=True))
+    files = sorted(files)
     if not files:
         print(f"[ERROR] No files matched any glob: {args.inputs}")
         sys.exit(2)
@@ -101,71 +122,14 @@ def main(argv):
     if not requested_cols:
         print("[ERROR] --text-cols must list at least one column")
         sys.exit(2)
+    requested_lower = [c.lower() for c in requested_cols]
 
-    results = []
-    for f in files:
-        try:
-            suf = Path(f).suffix.lower()
-            if suf in {".xlsx", ".xlsm", ".xls"}:
-                df = pd.read_excel(f, engine="openpyxl") if args.sheet is None else pd.read_excel(f, sheet_name=args.sheet, engine="openpyxl")
-            elif suf in {".csv", ".txt"}:
-                kwargs = {}
-                if args.encoding:
-                    kwargs["encoding"] = args.encoding
-                df = None
-                for d in [",", "\t", "|", ";"]:
-                    try:
-                        df = pd.read_csv(f, delimiter=d, **kwargs)
-                        break
-                    except Exception:
-                        continue
-                if df is None:
-                    df = pd.read_csv(f, **kwargs)
-            else:
-                continue
-        except Exception as e:
-            print(f"[WARN] Skipping {f}: {e}")
-            continue
-
-        df = df.dropna(how="all")
-
-        # resolve columns case-insensitively
-        lower = {str(c).lower(): c for c in df.columns}
-        cols = []
-        for name in requested_cols:
-            key = name.lower()
-            if key in lower:
-                cols.append(lower[key])
-            elif name in df.columns:
-                cols.append(name)
-
-        if not cols:
-            print(f"[INFO] No requested columns present in {f}; skipping.")
-            continue
-
-        # combine per row
-        row_texts = []
-        for _, row in df.iterrows():
-            bits = []
-            for c in cols:
-                val = row.get(c)
-                if pd.notna(val) and str(val).strip():
-                    bits.append(str(val).strip())
-            if bits:
-                row_texts.append((args.sep).join(bits))
-
-        if not row_texts:
-            continue
-
-        joined = "  ".join(row_texts) if args.join_style == "paragraph" else "\n".join(f"- {t}" for t in row_texts)
-
-        results.append({
-            "source_file": str(Path(f)),
-            "sheet": args.sheet if args.sheet is not None else "default",
-            "row_count_used": len(row_texts),
-            "columns_used": cols,
-            "joined_text": joined
-        })
+    # files are independent and parsing is CPU-bound, so spread them over
+    # worker processes; map() hands results back in the sorted file order
+    work = functools.partial(process_file, args=args, requested_cols=requested_cols,
+                             requested_lower=requested_lower)
+    with ProcessPoolExecutor() as ex:
+        results = [r for r in ex.map(work, files, chunksize=4) if r is not None]
 
     payload = {
         "sop": args.sop,
@@ -181,11 +145,13 @@ def main(argv):
         f"{args.sop} narration aggregate (JSON5).",
         "This file is generated. You may add comments, but do not edit the guarded default config.",
     ])
-    body = json.dumps(payload, ensure_ascii=False, indent=2)
-    text = f"{header}\n{body}\n"
-    text = append_defaults_guarded(text)
     outp.parent.mkdir(parents=True, exist_ok=True)
-    outp.write_text(text, encoding="utf-8")
+    # stream the body straight to the file, leaving the object open so the
+    # guarded defaults can go in before its closing brace
+    with outp.open("w", encoding="utf-8") as fh:
+        fh.write(f"{header}\n")
+        dump_json_unclosed(payload, fh)
+        fh.write(f",\n{DEFAULT_GUARD_BLOCK}}}\n")
     print(f"[OK] Wrote {len(results)} file-level entries to {outp}")
 
 if __name__ == "__main__":
@@ -11,14 +11,22 @@
 #       --text-cols "Task Description,What" \
 #       --join-style bullets
 #
-import argparse, json, glob, re, sys
+import argparse, glob, re, sys, functools
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 import pandas as pd
 
+# projected Excel read, column-wise row join and streamed JSON writer shared
+# with v3/v4/v5 (_common.py next to this script)
+from _common import read_excel_projected, join_row_texts, dump_json_unclosed
+
 SUPPORTED_XL = {".xlsx", ".xlsm", ".xls"}
 SUPPORTED_CSV = {".csv", ".txt"}
 
+# lower-cased headers read for the optional per-file metadata fields
+META_COLS = ("code", "uap label", "uap_label", "uap url", "uap_url", "oth1", "oth2")
+
 DO_NOT_EDIT_START = "// ===== BEGIN DEFAULT NARR CONFIG (do not edit) ====="
 DO_NOT_EDIT_END   = "// ===== END DEFAULT NARR CONFIG ====="
 
@@ -45,9 +53,11 @@ def is_excel(path: Path) -> bool:
 def is_csv_like(path: Path) -> bool:
     return path.suffix.lower() in SUPPORTED_CSV
 
-def read_any(path: str, sheet=None, encoding=None) -> pd.DataFrame:
+def read_any(path: str, sheet=None, encoding=None, wanted=None) -> pd.DataFrame:
     p = Path(path)
     if is_excel(p):
+        if wanted is not None:
+            return read_excel_projected(p, wanted, sheet)
         if sheet is None:
             return pd.read_excel(p)
         return pd.read_excel(p, sheet_name=sheet)
@@ -59,6 +69,7 @@ def read_any(path: str, sheet=None, encoding=None) -> pd.DataFrame:
     else:
         raise ValueError(f"Unsupported file type: {path}")
 
+@functools.lru_cache(maxsize=4096)
 def to_title(stem: str) -> str:
     # crude: split on underscores/dashes, capitalize words
     parts = re.split(r"[_\-]+", stem)
@@ -67,6 +78,72 @@ def to_title(stem: str) -> str:
         return stem
     return " ".join(w.capitalize() for w in parts)
 
+def _first_nonblank(df: pd.DataFrame, col_name) -> str:
+    # first non-missing, non-blank value of the column as stripped str()
+    # ("" if the column is absent or has none)
+    if not col_name or col_name not in df.columns:
+        return ""
+    s = df[col_name].dropna().astype(object).astype(str).str.strip()
+    s = s[s != ""]
+    return s.iat[0] if len(s) else ""
+
+def process_file(f, args, requested_cols, requested_lower, wanted):
+    # One input file -> its entry, or None when the file is skipped. No
+    # shared state, so main() can run these in worker processes.
+    try:
+        df = read_any(f, sheet=args.sheet, encoding=args.encoding, wanted=wanted)
+    except Exception as e:
+        print(f"[WARN] Skipping {f}: {e}")
+        return None
+    df = df.dropna(how="all")
+
+    lower = dict(zip(df.columns.astype(str).str.lower(), df.columns))
+    cols = [lower[key] if key in lower else name
+            for name, key in zip(requested_cols, requested_lower)
+            if key in lower or name in df.columns]
+
+    if not cols:
+        print(f"[INFO] No requested columns present in {f}; skipping.")
+        return None
+
+    row_texts = join_row_texts(df, cols, args.sep)
+
+    if not row_texts:
+        return None
+
+    joined = "  ".join(row_texts) if args.join_style == "paragraph" else "\n".join(f"- {t}" for t in row_texts)
+
+    # Optional per-file metadata (Code, UAP fields, Oth1/Oth2)
+    code_col = lower.get("code")
+    uap_label_col = lower.get("uap label") or lower.get("uap_label")
+    uap_url_col = lower.get("uap url") or lower.get("uap_url")
+    oth1_col = lower.get("oth1")
+    oth2_col = lower.get("oth2")
+
+    step_code = _first_nonblank(df, code_col)
+    uap_label = _first_nonblank(df, uap_label_col)
+    uap_url = _first_nonblank(df, uap_url_col)
+    oth1 = _first_nonblank(df, oth1_col)
+    oth2 = _first_nonblank(df, oth2_col)
+
+    p = Path(f)
+    base = p.name
+    stem = p.stem
+    return {
+        "base": base,
+        "title": to_title(stem),
+        "path": str(p),
+        "sheet": args.sheet if args.sheet is not None else "default",
+        "columns_used": cols,
+        "row_count_used": len(row_texts),
+        "joined_text": joined,
+        "step_code": step_code,
+        "uap_label": uap_label,
+        "uap_url": uap_url,
+        "oth1": oth1,
+        "oth2": oth2,
+    }
+
 def main(argv):
     ap = argparse.ArgumentParser(description="Emit Tech_Nar-style JSON5 with file-level joined narration.")
     ap.add_argument("--inputs", required=True, help='Comma-separated globs (e.g. "/path/*.xlsx,/path/*.csv")')
@@ -80,7 +157,10 @@ def main(argv):
     args = ap.parse_args(argv)
 
     globs = [g.strip() for g in args.inputs.split(",") if g.strip()]
-    files = sorted({f for g in globs for f in glob.glob(g, recursive=True)})
+    files = set()
+    for g in globs:
+        files.update(glob.iglob(g, recursive=True))
+    files = sorted(files)
     if not files:
         print(f"[ERROR] No files matched any glob: {args.inputs}")
         sys.exit(1)
@@ -89,83 +169,17 @@ def main(argv):
     if not requested_cols:
         print("[ERROR] --text-cols must list at least one column")
         sys.exit(2)
+    requested_lower = [c.lower() for c in requested_cols]
 
-    entries = []  # aggregated per-file
-    for f in files:
-        try:
-            df = read_any(f, sheet=args.sheet, encoding=args.encoding)
-        except Exception as e:
-            print(f"[WARN] Skipping {f}: {e}")
-            continue
-        df = df.dropna(how="all")
-
-        lower = {str(c).lower(): c for c in df.columns}
-        cols = []
-        for name in requested_cols:
-            key = name.lower()
-            cols.append(lower.get(key, name if name in df.columns else None))
-        cols = [c for c in cols if c is not None]
-
-        if not cols:
-            print(f"[INFO] No requested columns present in {f}; skipping.")
-            continue
-
-        row_texts = []
-        for _, row in df.iterrows():
-            bits = []
-            for c in cols:
-                val = row.get(c)
-                if pd.notna(val) and str(val).strip():
-                    bits.append(str(val).strip())
-            if bits:
-                row_texts.append((args.sep).join(bits))
-
-        if not row_texts:
-            continue
-
-        joined = "  ".join(row_texts) if args.join_style == "paragraph" else "\n".join(f"- {t}" for t in row_texts)
-
-        # Optional per-file metadata (Code, UAP fields, Oth1/Oth2)
-        def _first_nonblank(col_name: str):
-            if not col_name or col_name not in df.columns:
-                return ""
-            series = df[col_name]
-            for v in series:
-                if pd.notna(v):
-                    s = str(v).strip()
-                    if s:
-                        return s
-            return ""
-
-        code_col = lower.get("code")
-        uap_label_col = lower.get("uap label") or lower.get("uap_label")
-        uap_url_col = lower.get("uap url") or lower.get("uap_url")
-        oth1_col = lower.get("oth1")
-        oth2_col = lower.get("oth2")
-
-        step_code = _first_nonblank(code_col)
-        uap_label = _first_nonblank(uap_label_col)
-        uap_url = _first_nonblank(uap_url_col)
-        oth1 = _first_nonblank(oth1_col)
-        oth2 = _first_nonblank(oth2_col)
-
-        p = Path(f)
-        base = p.name
-        stem = p.stem
-        entries.append({
-            "base": base,
-            "title": to_title(stem),
-            "path": str(p),
-            "sheet": args.sheet if args.sheet is not None else "default",
-            "columns_used": cols,
-            "row_count_used": len(row_texts),
-            "joined_text": joined,
-            "step_code": step_code,
-            "uap_label": uap_label,
-            "uap_url": uap_url,
-            "oth1": oth1,
-            "oth2": oth2,
-        })
+    # Excel inputs only need these columns; everything else stays unparsed
+    wanted = requested_cols + list(META_COLS)
+
+    # files are independent and parsing is CPU-bound, so spread them over
+    # worker processes; map() hands results back in the sorted file order
+    work = functools.partial(process_file, args=args, requested_cols=requested_cols,
+                             requested_lower=requested_lower, wanted=wanted)
+    with ProcessPoolExecutor() as ex:
+        entries = [e for e in ex.map(work, files, chunksize=4) if e is not None]
 
     # Build Tech_Nar-style sections
     file_titles = {e["base"]: e["title"] for e in entries}
@@ -209,7 +223,6 @@ def main(argv):
         "Auto-generated. You may comment anywhere, but do not edit the guarded default config below."
     ]
     header_txt = "\n".join(f"// {ln}" for ln in header)
-    body = json.dumps(payload, ensure_ascii=False, indent=2)
     guard = (
         f"\n// ===== BEGIN DEFAULT NARR CONFIG (do not edit) =====\n"
         f"  summarize: {DEFAULT_SUMMARIZE},\n"
@@ -218,16 +231,14 @@ def main(argv):
         f"// ===== END DEFAULT NARR CONFIG =====\n"
     )
 
-    # Insert guard before final closing brace by adding a trailing comma safely
-    # Our body ends with '}\n'. We'll insert before that.
-    if body.rstrip().endswith('}'):
-        body2 = body.rstrip()[:-1] + ",\n" + guard + "}\n"
-    else:
-        body2 = body + "\n" + guard
-
+    # Stream the body to the file with its closing brace held back, then
+    # add a trailing comma, the guard block and the brace
     outp = Path(args.out)
     outp.parent.mkdir(parents=True, exist_ok=True)
-    outp.write_text(f"{header_txt}\n{body2}", encoding="utf-8")
+    with outp.open("w", encoding="utf-8") as fh:
+        fh.write(f"{header_txt}\n")
+        dump_json_unclosed(payload, fh)
+        fh.write("\n,\n" + guard + "}\n")
     print(f"[OK] Wrote {len(entries)} entries to {outp}")
 
 if __name__ == "__main__":
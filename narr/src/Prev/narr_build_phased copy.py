@@ -10,13 +10,24 @@ Phased narration builder with:
   - Only *_latest files live directly in <outdir>/ (overwritten each run)
   - Final outputs scrub NaN/None/'nan' to blanks and drop empty rows
 """
-import argparse, glob, json, os, re, sys
+import argparse, functools, glob, importlib.util, json, os, re, shutil, sys
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from typing import Dict, Any, List
 import pandas as pd
 import numpy as np
 
+# python-calamine (Rust) reads workbooks several times faster than openpyxl;
+# use it when installed, else pandas' default engine
+XL_ENGINE = "calamine" if importlib.util.find_spec("python_calamine") else None
+
+# JSON5 -> JSON cleanup for when the json5 package isn't available
+_C_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_LINE_COMMENT = re.compile(r"(^|[^:])//.*?$", re.M)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_BARE_KEY = re.compile(r'([\[{\s,])([A-Za-z_]\w*)\s*:')
+
 def load_config_any(path: str) -> Dict[str, Any]:
     try:
         import json5  # type: ignore
@@ -26,23 +37,27 @@ def load_config_any(path: str) -> Dict[str, Any]:
         pass
     with open(path, "r", encoding="utf-8") as f:
         raw = f.read()
-    cleaned = re.sub(r"/\*.*?\*/", "", raw, flags=re.S)
-    cleaned = re.sub(r"(^|[^:])//.*?$", r"\1", cleaned, flags=re.M)
-    cleaned = re.sub(r",\s*([}\]])", r"\1", cleaned)
+    cleaned = _C_COMMENT.sub("", raw)
+    cleaned = _LINE_COMMENT.sub(r"\1", cleaned)
+    cleaned = _TRAILING_COMMA.sub(r"\1", cleaned)
     def repl(m): return f'{m.group(1)}"{m.group(2)}":'
-    cleaned = re.sub(r'([[{\s,])([A-Za-z_]\w*)\s*:', repl, cleaned)
+    cleaned = _BARE_KEY.sub(repl, cleaned)
     return json.loads(cleaned)
 
+# same few header names in every file of a SOP; cache the regex work
+@functools.lru_cache(maxsize=16384)
 def norm_header(x: str) -> str:
     return re.sub(r"\s+", " ", (x or "")).strip().lower()
 
 def list_sheets(path: str) -> list[str]:
-    with pd.ExcelFile(path) as xlf:
+    with pd.ExcelFile(path, engine=XL_ENGINE) as xlf:
         return list(xlf.sheet_names)
 
-def resolve_sheet(path: str, desired: str|None, fallback_opm: bool = True) -> str|int:
+def resolve_sheet(path: str, desired: str|None, fallback_opm: bool = True,
+                  names: list[str]|None = None) -> str|int:
     try:
-        names = list_sheets(path)
+        if names is None:
+            names = list_sheets(path)
         lower_map = {n.lower(): n for n in names}
         if desired:
             d = str(desired).lower()
@@ -56,9 +71,14 @@ def resolve_sheet(path: str, desired: str|None, fallback_opm: bool = True) -> st
     except Exception:
         return 0
 
-def read_excel_resolved(path: str, desired_sheet: str|None) -> pd.DataFrame:
-    sheet_to_use = resolve_sheet(path, desired_sheet, fallback_opm=True)
-    return pd.read_excel(path, sheet_name=sheet_to_use, dtype=str)
+def read_excel_resolved(path: str, desired_sheet: str|None, xlf: pd.ExcelFile|None = None) -> pd.DataFrame:
+    # with an open ExcelFile, the sheet is resolved and parsed from it
+    # instead of opening the workbook again for each step
+    if xlf is None:
+        sheet_to_use = resolve_sheet(path, desired_sheet, fallback_opm=True)
+        return pd.read_excel(path, sheet_name=sheet_to_use, dtype=str, engine=XL_ENGINE)
+    sheet_to_use = resolve_sheet(path, desired_sheet, fallback_opm=True, names=list(xlf.sheet_names))
+    return pd.read_excel(xlf, sheet_name=sheet_to_use, dtype=str)
 
 def pick_text_columns(df: pd.DataFrame, preferred: List[str]) -> List[str]:
     nmap = {norm_header(c): c for c in df.columns}
@@ -66,21 +86,23 @@ def pick_text_columns(df: pd.DataFrame, preferred: List[str]) -> List[str]:
     chosen = [c for c in chosen if c]
     return chosen if chosen else [c for c in df.columns if df[c].dtype == "object"]
 
+_to_str = np.frompyfunc(str, 1, 1)
+
 def extract_text_block(df: pd.DataFrame, text_cols: List[str], drop_values: List[str], joiner: str) -> str:
     if not text_cols:
         return ""
-    def row_ok(row) -> bool:
-        for c in text_cols:
-            if str(row.get(c, "")) in drop_values:
-                return False
-        return True
-    rows_ok = df.apply(row_ok, axis=1)
-    df2 = df[rows_ok].copy()
-    lines = []
-    for _, row in df2.iterrows():
-        parts = [str(row[c]).strip() for c in text_cols if str(row[c]).strip()]
-        if parts:
-            lines.append(" ".join(parts))
+    # str() of every cell in one numpy pass (missing cells read as "nan",
+    # as the old per-row loop did), then drop rows holding a drop value.
+    # frompyfunc keeps plain str objects; astype(str) would build a
+    # fixed-width array padding every cell to the longest one.
+    cells = pd.DataFrame(_to_str(df[text_cols].to_numpy(dtype=object, na_value=np.nan)), index=df.index)
+    rows_ok = ~cells.isin(set(drop_values)).any(axis=1)
+    if not rows_ok.all():
+        cells = cells[rows_ok]
+    df2 = cells.apply(lambda s: s.str.strip())
+    # blank parts only add spaces, which the \s+ collapse below removes
+    joined = df2.iloc[:, 0].str.cat([df2[c] for c in df2.columns[1:]], sep=" ").str.strip()
+    lines = joined[joined != ""].tolist()
     text = " ".join(lines).strip() if joiner == " " else joiner.join(lines).strip()
     return re.sub(r"\s+", " ", text)
 
@@ -102,6 +124,47 @@ def simplify_text(text: str, max_len: int = 24) -> str:
         out.append(s)
     return (". ".join(out) + ".") if out else ""
 
+def validate_frame(base: str, sheet, ov: Dict[str, Any], df: pd.DataFrame, std_norm: List[str]):
+    ok, err = True, ""
+    try:
+        cols = {norm_header(c) for c in df.columns}
+        manual_norm = {norm_header(k) for k in ov.get("manual_map", {})}
+        missing = [c for c in std_norm if c not in cols and c not in manual_norm]
+        if missing:
+            ok, err = False, f"missing expected {missing}"
+    except Exception as e:
+        ok, err = False, f"cannot read sheet '{sheet}': {e}"
+    return base, ok, err
+
+def extract_frame(base: str, ov: Dict[str, Any], df: pd.DataFrame, std_norm: List[str],
+                  preferred: List[str], drop_vals: List[str], line_join: str):
+    issues = []
+    df.columns = [norm_header(c) for c in df.columns]
+    rename = { norm_header(src): norm_header(tgt) for src, tgt in ov.get("manual_map", {}).items() }
+    if rename: df = df.rename(columns=rename)
+    missing = [c for c in std_norm if c not in df.columns]
+    if missing: issues.append(f"{base}: missing expected columns {missing} (continuing)")
+    text_cols = pick_text_columns(df, preferred)
+    return base, extract_text_block(df, text_cols, drop_vals, line_join), issues
+
+def process_file(f: str, overrides: Dict[str, Any], std_sheet, std_norm: List[str],
+                 preferred: List[str], drop_vals: List[str], line_join: str, extract: bool = True):
+    # -> (validation, extraction): (base, ok, err) and (base, text or None
+    # if unreadable, issues), extraction None when not asked for. The
+    # workbook is opened and its sheet parsed once for both phases.
+    base = os.path.basename(f)
+    ov = overrides.get(base, {}); sheet = ov.get("sheet", std_sheet)
+    try:
+        with pd.ExcelFile(f, engine=XL_ENGINE) as xlf:
+            df = read_excel_resolved(f, sheet, xlf)
+    except Exception as e:
+        err = f"cannot read sheet '{sheet}': {e}"
+        return (base, False, err), ((base, None, [f"{base}: {err}"]) if extract else None)
+    validation = validate_frame(base, sheet, ov, df, std_norm)
+    if not extract:
+        return validation, None
+    return validation, extract_frame(base, ov, df, std_norm, preferred, drop_vals, line_join)
+
 def now_ny() -> str:
     return datetime.now().strftime("%d%m%y_%H%M")
 
@@ -136,7 +199,7 @@ def main():
     intm_dir = outdir / "Intm"; intm_dir.mkdir(parents=True, exist_ok=True)
     qa_dir = outdir / "QA"; qa_dir.mkdir(parents=True, exist_ok=True)
 
-    files = sorted(glob.glob(args.inputs))
+    files = sorted(glob.iglob(args.inputs))
     if not files:
         print("[ERROR] No input files matched.", file=sys.stderr); sys.exit(2)
 
@@ -147,29 +210,28 @@ def main():
             return (0, order_map[b]) if b in order_map else (1, b.lower())
         files.sort(key=key_fn)
 
+    # normalized once; both phases compare against these
+    std_norm = [norm_header(c) for c in std_cols]
+
+    # Per-file work is independent Excel parsing (CPU-bound), so it runs in
+    # worker processes; map() keeps the sorted file order. Each file is read
+    # once and checked + extracted in the same worker; results are reported
+    # phase by phase below.
     print("== Phase: VALIDATE ==")
-    issues, validation = [], []
-    for f in files:
-        base = os.path.basename(f)
-        ov = overrides.get(base, {}); sheet = ov.get("sheet", std_sheet)
-        ok, err = True, ""
-        try:
-            df = read_excel_resolved(f, sheet)
-            df.columns = [norm_header(c) for c in df.columns]
-            manual_map = ov.get("manual_map", {})
-            missing = [norm_header(c) for c in std_cols
-                       if norm_header(c) not in df.columns and
-                          norm_header(c) not in [norm_header(k) for k in manual_map.keys()]]
-            if missing:
-                ok, err = False, f"missing expected {missing}"
-        except Exception as e:
-            ok, err = False, f"cannot read sheet '{sheet}': {e}"
-        validation.append((base, ok, err))
+    stop_at_validate = args.only_validate or args.stop_after == "validate"
+    issues = []
+    work = functools.partial(process_file, overrides=overrides, std_sheet=std_sheet, std_norm=std_norm,
+                             preferred=preferred, drop_vals=drop_vals, line_join=line_join,
+                             extract=not stop_at_validate)
+    with ProcessPoolExecutor() as ex:
+        processed = list(ex.map(work, files, chunksize=4))
+    validation = [v for v, _ in processed]
+    for base, ok, err in validation:
         if not ok: issues.append(f"{base}: {err}")
     for base, ok, err in validation:
         print(f" - {base}: {'OK' if ok else 'ISSUE'}{'' if ok else '  -> ' + err}")
 
-    if args.only_validate or args.stop_after == "validate":
+    if stop_at_validate:
         ts = now_ny()
         qa = qa_dir / f"{args.sop}_narr_{ts}_QA.txt"
         qa.write_text("\n".join([f"{b}: {'OK' if ok else 'ISSUE - ' + e}" for (b,ok,e) in validation]), encoding="utf-8")
@@ -178,20 +240,9 @@ def main():
 
     print("== Phase: EXTRACT ==")
     rows, p_idx = [], 1
-    for f in files:
-        base = os.path.basename(f)
-        ov = overrides.get(base, {}); sheet = ov.get("sheet", std_sheet)
-        try:
-            df = read_excel_resolved(f, sheet)
-        except Exception as e:
-            issues.append(f"{base}: cannot read sheet '{sheet}': {e}"); continue
-        df.columns = [norm_header(c) for c in df.columns]
-        rename = { norm_header(src): norm_header(tgt) for src, tgt in ov.get("manual_map", {}).items() }
-        if rename: df = df.rename(columns=rename)
-        missing = [norm_header(c) for c in std_cols if norm_header(c) not in df.columns]
-        if missing: issues.append(f"{base}: missing expected columns {missing} (continuing)")
-        text_cols = pick_text_columns(df, preferred)
-        text_in = extract_text_block(df, text_cols, drop_vals, line_join)
+    for _, (base, text_in, file_issues) in processed:
+        issues.extend(file_issues)
+        if text_in is None: continue
         rows.append({"OPM_Step": f"P{p_idx}", "Source_File": base,
                      "Source_Title": file_titles.get(base, os.path.splitext(base)[0]),
                      "Step_narr_in": text_in})
@@ -207,9 +258,11 @@ def main():
 
     print("== Phase: MERGE ==")
     if rows:
-        merged = " ".join([r["Step_narr_in"] for r in rows if r.get("Step_narr_in")]).strip()
-        rows_merge = rows + [{"OPM_Step":"PM","Source_File":"","Source_Title":f"{args.sop} – Master",
-                              "Step_narr_in": merged, "Step_narr_m_in": merged}]
+        merged = " ".join(r["Step_narr_in"] for r in rows if r.get("Step_narr_in")).strip()
+        # rows isn't used on its own after this point, so extend it in place
+        rows.append({"OPM_Step":"PM","Source_File":"","Source_Title":f"{args.sop} – Master",
+                     "Step_narr_in": merged, "Step_narr_m_in": merged})
+        rows_merge = rows
     else:
         issues.append("No usable rows produced during extract."); rows_merge = rows
 
@@ -233,9 +286,13 @@ def main():
 
     # Clean NaN/None/'nan' and drop empty rows
     df_out = df_out.replace({np.nan: ""})
-    df_out = df_out.applymap(lambda v: "" if (isinstance(v, str) and v.strip().lower() == "nan") else v)
-    def _blank(x): return (not isinstance(x, str)) or (x.strip() == "")
-    keep_mask = ~(df_out["Step_narr_in"].apply(_blank) & df_out["Step_narr_out"].apply(_blank))
+    for c in df_out.columns:
+        s = df_out[c]
+        if s.dtype == object or isinstance(s.dtype, pd.StringDtype):
+            df_out[c] = s.mask(s.str.strip().str.lower().eq("nan"), "")
+    # blank = non-string or whitespace only (.str gives NaN for non-strings)
+    def _blank(s): return s.str.strip().fillna("").eq("")
+    keep_mask = ~(_blank(df_out["Step_narr_in"]) & _blank(df_out["Step_narr_out"]))
     df_out = df_out[keep_mask].copy()
 
     base_name = f"{args.sop}_narr_{ts}"
@@ -263,11 +320,12 @@ def main():
     print(f"[OK] XLSX (timestamped -> Intm): {xlsx_path_ts}")
     print(f"[OK] QA  (-> QA): {qa_path}")
 
+    # *_latest are the same content as the timestamped files: copy the
+    # bytes rather than serializing df_out a second time
     latest_csv  = outdir / f"{args.sop}_narr_latest.csv"
     latest_xlsx = outdir / f"{args.sop}_narr_latest.xlsx"
-    df_out.to_csv(latest_csv, index=False, encoding="utf-8-sig")
-    with pd.ExcelWriter(latest_xlsx, engine="xlsxwriter") as xlw:
-        df_out.to_excel(xlw, index=False, sheet_name="Narration")
+    shutil.copyfile(csv_path_ts, latest_csv)
+    shutil.copyfile(xlsx_path_ts, latest_xlsx)
     print(f"[OK] Latest CSV (-> outdir): {latest_csv}")
     print(f"[OK] Latest XLSX (-> outdir): {latest_xlsx}")
 
@@ -27,16 +27,33 @@ If the source workbook has UAP / other helper columns, they are also copied:
 
   UAP url, UAP Label, Code, Oth1, Oth2, "used for creation only"
 
+With --output-format csv the same per-step rows are written as .csv files
+instead (much cheaper to write; the make_sop_nar_json scripts read both).
+
 Version: 20251205_0900 (America/New_York)
 Authors: Subi Rajagopalan   with assistance from ChatGPT (OpenAI)
 """
 
 import argparse
+import csv
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import openpyxl
 import pandas as pd
 
+# openpyxl streams the rows in read-only mode with cached cell values
+# instead of formulas; read_excel() takes those as engine_kwargs from
+# pandas 2.1 on, older pandas just uses its own defaults.
+XL_READ_KW = {"engine": "openpyxl"}
+if tuple(int(x) for x in pd.__version__.split(".")[:2] if x.isdigit()) >= (2, 1):
+    XL_READ_KW["engine_kwargs"] = {"read_only": True, "data_only": True}
+
+_WS_RE = re.compile(r"\s+")
+_FNAME_BAD_RE = re.compile(r'[<>:"/\\|?*]+')
+_FNAME_KEEP_RE = re.compile(r"[^\w\-.]")
+
 
 def safe_name(text: str, max_length: int = 80) -> str:
     """
@@ -51,16 +68,49 @@ def safe_name(text: str, max_length: int = 80) -> str:
     if not s:
         return "step"
     # Collapse whitespace
-    s = re.sub(r"\s+", "_", s)
+    s = _WS_RE.sub("_", s)
     # Remove characters that are troublesome on Windows/macOS/Linux
-    s = re.sub(r'[<>:"/\\|?*]+', "", s)
+    s = _FNAME_BAD_RE.sub("", s)
     # Keep only word chars, dash, underscore, dot
-    s = re.sub(r"[^\w\-.]", "", s)
+    s = _FNAME_KEEP_RE.sub("", s)
     if not s:
         s = "step"
     return s[:max_length]
 
 
+def fast_write_xlsx(data: dict, path: Path) -> None:
+    """
+    Write a one-row workbook (header + values) with openpyxl's write-only
+    mode. Each per-step file holds exactly one data row, so building a
+    DataFrame and going through to_excel is pure overhead here.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(list(data.keys()))
+    # blanks come through as NaN; leave those cells empty like to_excel
+    # does, and skip the row altogether when nothing in it has a value
+    values = [None if pd.isna(v[0]) else v[0] for v in data.values()]
+    if any(v is not None and v != "" for v in values):
+        ws.append(values)
+    wb.save(path)
+
+
+def fast_write_csv(data: dict, path: Path) -> None:
+    """
+    CSV counterpart of fast_write_xlsx: header row plus one data row
+    (left out when every cell is blank), NaN cells written empty.
+    """
+    values = ["" if pd.isna(v[0]) else v[0] for v in data.values()]
+    with open(path, "w", encoding="utf-8", newline="") as fh:
+        w = csv.writer(fh)
+        w.writerow(data.keys())
+        if any(v != "" for v in values):
+            w.writerow(values)
+
+
+WRITERS = {"xlsx": fast_write_xlsx, "csv": fast_write_csv}
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         description=(
@@ -85,6 +135,12 @@ def main() -> None:
         required=True,
         help="Directory where per-step Excel files will be written.",
     )
+    parser.add_argument(
+        "--output-format",
+        choices=sorted(WRITERS),
+        default="xlsx",
+        help="File type of the per-step files (xlsx or csv). Default: xlsx",
+    )
 
     # Column mapping options (defaults match your existing patterns)
     parser.add_argument(
@@ -131,7 +187,17 @@ def main() -> None:
     out_dir.mkdir(parents=True, exist_ok=True)
 
     print(f"[INFO] Reading master workbook: {in_path}")
-    df = pd.read_excel(in_path)
+    # Only the columns this script copies are parsed; the rest of the sheet
+    # is skipped.
+    wanted = {
+        args.step_col, args.task_col, args.what_col, args.consid_col,
+        args.uap_url_col, args.uap_label_col, "Code", "Oth1", "Oth2",
+    }
+    df = pd.read_excel(
+        in_path,
+        **XL_READ_KW,
+        usecols=lambda c: c in wanted or str(c).strip().lower() == "used for creation only",
+    )
 
     # Basic sanity checks
     required_cols = [args.task_col, args.what_col]
@@ -157,11 +223,62 @@ def main() -> None:
             break
 
     total_rows = len(df)
-    written = 0
-
-    for idx, row in df.iterrows():
-        task = row.get(args.task_col)
-        what = row.get(args.what_col)
+    written = []
+    # out path -> data; a later row that maps to the same file name wins,
+    # as it did when files were written one by one in row order
+    pending = {}
+    write_step = WRITERS[args.output_format]
+    ext = args.output_format
+
+    # Output column -> source column, in the order the per-step workbook
+    # gets them. None means "no source column": the cell is left blank.
+    copy_cols = [
+        ("Task Description", args.task_col),
+        ("What", args.what_col),
+        # Considerations: copy if present, otherwise leave blank
+        ("Considerations", args.consid_col if has_consider else None),
+    ]
+    # UAP fields: include only if present in source
+    if has_uap_url:
+        copy_cols.append(("UAP url", args.uap_url_col))
+    if has_uap_label:
+        copy_cols.append(("UAP Label", args.uap_label_col))
+    # Code column: prefer explicit 'Code' column; otherwise, reuse step-col
+    # so downstream scripts can still see a 'Code' field.
+    # If neither exists, we simply omit the Code column.
+    if has_code_col:
+        copy_cols.append(("Code", "Code"))
+    elif has_step:
+        copy_cols.append(("Code", args.step_col))
+    # Oth1 / Oth2: carry through if present in the overall file
+    if has_oth1:
+        copy_cols.append(("Oth1", "Oth1"))
+    if has_oth2:
+        copy_cols.append(("Oth2", "Oth2"))
+    # "used for creation only" helper column: carry through if present
+    if used_for_creation_col is not None:
+        copy_cols.append((used_for_creation_col, used_for_creation_col))
+
+    # itertuples() hands back plain tuples (no per-row Series), so columns
+    # are read by position; +1 skips the index in front.
+    col_pos = {col: i + 1 for i, col in enumerate(df.columns)}
+    copy_pos = [(out_col, col_pos[src] if src is not None else None)
+                for out_col, src in copy_cols]
+    task_pos = col_pos[args.task_col]
+    what_pos = col_pos[args.what_col]
+
+    # File name pieces for every row, computed up front
+    safe_tasks = df[args.task_col].map(safe_name).tolist()
+    # Step code (P1, P2, PM, etc.) is optional but nice to have
+    if has_step:
+        step_codes = [str(v).strip() if v is not None else "" for v in df[args.step_col]]
+    else:
+        step_codes = [""] * total_rows
+
+    for i, row in enumerate(df.itertuples(index=True, name=None)):
+        idx = row[0]
+        task = row[task_pos]
+        what = row[what_pos]
 
         # Skip rows that don't have a real step
         if (task is None or str(task).strip() == "") and (
@@ -174,63 +291,31 @@ def main() -> None:
             print(f"[WARN] Row {idx} has narration but no task description; skipping.")
             continue
 
-        # Step code (P1, P2, PM, etc.) is optional but nice to have
-        step_code = ""
-        if has_step:
-            raw_step = row.get(args.step_col)
-            if raw_step is not None and str(raw_step).strip():
-                step_code = str(raw_step).strip()
-
-        safe_task = safe_name(task)
+        step_code = step_codes[i]
+        safe_task = safe_tasks[i]
         if step_code:
-            filename = f"{args.sop}_{step_code}_{safe_task}.xlsx"
+            filename = f"{args.sop}_{step_code}_{safe_task}.{ext}"
         else:
-            filename = f"{args.sop}_{safe_task}.xlsx"
+            filename = f"{args.sop}_{safe_task}.{ext}"
 
-        # Core fields
         data = {
-            "Task Description": [task],
-            "What": [what],
+            out_col: [row[pos] if pos is not None else ""]
+            for out_col, pos in copy_pos
         }
 
-        # Considerations: copy if present, otherwise leave blank
-        if has_consider:
-            data["Considerations"] = [row.get(args.consid_col)]
-        else:
-            data["Considerations"] = [""]
-
-        # UAP fields: include only if present in source
-        if has_uap_url:
-            data["UAP url"] = [row.get(args.uap_url_col)]
-        if has_uap_label:
-            data["UAP Label"] = [row.get(args.uap_label_col)]
-
-        # Code column: prefer explicit 'Code' column; otherwise, reuse step-col
-        if has_code_col:
-            data["Code"] = [row.get("Code")]
-        elif has_step:
-            # This ensures downstream scripts can still see a 'Code' field
-            data["Code"] = [row.get(args.step_col)]
-        # If neither exists, we simply omit the Code column
-
-        # Oth1 / Oth2: carry through if present in the overall file
-        if has_oth1:
-            data["Oth1"] = [row.get("Oth1")]
-        if has_oth2:
-            data["Oth2"] = [row.get("Oth2")]
-
-        # "used for creation only" helper column: carry through if present
-        if used_for_creation_col is not None:
-            data[used_for_creation_col] = [row.get(used_for_creation_col)]
-
-        out_df = pd.DataFrame(data)
         out_path = out_dir / filename
-        out_df.to_excel(out_path, index=False)
-        written += 1
+        pending[out_path] = data
+        written.append(out_path)
+
+    # the files are independent and serializing them is CPU-bound, so
+    # spread them over worker processes
+    with ProcessPoolExecutor() as ex:
+        list(ex.map(write_step, pending.values(), pending.keys(), chunksize=4))
+    for out_path in written:
         print(f"[OK] Wrote {out_path}")
 
     print(
-        f"[DONE] Processed {total_rows} row(s), wrote {written} per-step workbook(s) "
+        f"[DONE] Processed {total_rows} row(s), wrote {len(written)} per-step workbook(s) "
         f"to {out_dir}"
     )
 
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+#
+# Shared text helpers for the build_narr_latest_* scripts in this folder
+# (v2, "v3 copy", v3worked_b4_addUAP_Oth).
+#
+# They used to carry their own copies of these functions. Keeping one copy
+# here means the patterns compile once per process and any fix lands in
+# all three scripts at once.
+#
+# The scripts are run directly (python build_narr_latest_v2.py ...), so
+# this folder is on sys.path and a plain "from narr_text import ..." works.
+#
+import csv, re, os, io, functools
+
+#
+# --- precompiled patterns (these run once per bullet line / per row) ---
+#
+# one left-to-right scan over the JSON5 text: string literals are matched
+# first (and kept whole), so "//" or "/*" inside a string is never touched
+_JSON5_SCAN_RE = re.compile(
+    r'"(?:\\.|[^"\\])*"'                          # "string literal" -> keep
+    r'|//[^\n]*'                                  # // line comment -> drop
+    r'|/\*.*?\*/'                                 # /* block comment */ -> drop
+    r'|,(?=(?:\s|//[^\n]*|/\*.*?\*/)*[}\]])',     # trailing comma -> drop
+    re.DOTALL
+)
+
+def _json5_keep_strings(m):
+    tok = m.group(0)
+    return tok if tok[0] == '"' else ""
+
+_WS_RE = re.compile(r"\s+")
+_SENT_RE = re.compile(r"[.!?]+")
+
+# unicode dashes / bullets -> "-" in one translate pass
+_DASH_TABLE = str.maketrans({"—": "-", "–": "-", "•": "-"})
+
+# common action verbs: a split marker goes in front of each so we get shorter steps
+_VERBS = [
+    r"Click", r"Select", r"Change", r"Mark", r"Enter", r"Save",
+    r"Apply", r"Open", r"Go to", r"Drill", r"Search", r"Filter",
+    r"Choose", r"Type", r"Set", r"Exit", r"Pick"
+]
+_VERB_RE = re.compile(r"(" + r"|".join(_VERBS) + r")\b", re.I)
+
+# boilerplate screen intros / UI fluff, then common UI nouns that don't add
+# meaning for the tech -- one alternation so each chunk is scanned once
+_STRIP_RE = re.compile(
+    r"\b(?:"
+    r"From the|From The|In the|In The|On the|On The|At the|At The|"
+    r"Use the|Use The|Using the|Using The|With the|With The|"
+    r"From The Service Order[s]? Screen|From The Warranty Claim Reconciliation Screen|"
+    r"From The Order Inquiry Screen|From The CSD Search Field"
+    r"|Screen|Button|Icon|Tab|Field|Section|Menu|Funnel Icon"
+    r")\b",
+    re.I
+)
+
+FIELDNAMES = [
+    "OPM_Step",
+    "Source_File",
+    "Source_Title",
+    "Step_narr_in",
+    "Step_narr_m_in",
+    "Step_narr_out",
+    "Step_narr_out_simple",
+    "Step_narr_m_out",
+    "Step_narr_m_out_simple",
+]
+
+#
+# --- helper: strip off the config tail that isn't valid JSON ---
+#
+def trim_after_config_block(full_text: str) -> str:
+    """
+    Your Warranty_narr_files.json5 ends with a block like:
+
+    // ===== BEGIN DEFAULT NARR CONFIG ...
+    summarize: { ... },
+    output: { ... },
+    logging: { ... }
+    // ===== END DEFAULT NARR CONFIG =====
+    }
+
+    That block uses unquoted keys ("summarize:", etc.) so it's not valid JSON.
+
+    We don't need that tail to build *_narr_latest.csv. We only need:
+      - sequence_order
+      - file_titles
+      - extraction.files[*].file
+      - extraction.files[*].joined_text
+
+    So: if we see the marker line for the default config, we cut everything
+    from that marker onward, and then make sure we close the main object "}".
+    """
+    marker = "===== BEGIN DEFAULT NARR CONFIG"
+    idx = full_text.find(marker)
+    if idx == -1:
+        # no marker, return as-is
+        return full_text
+
+    # keep everything BEFORE the marker
+    kept = full_text[:idx]
+
+    # Now, 'kept' likely ends with a comma and maybe some whitespace/newlines,
+    # because the config block in the .json5 is preceded by a comma.
+    # Example:  },\n\n// ===== BEGIN DEFAULT...
+    # We should safely strip trailing commas, then close the JSON object.
+
+    # Drop anything after the last newline before the marker that's just commas/braces.
+    kept = kept.rstrip(", \n\r\t")
+
+    # Make sure it ends with a single newline then a closing brace
+    if not kept.rstrip().endswith("}"):
+        kept = kept.rstrip() + "\n}"
+
+    return kept
+
+#
+# --- JSON5 helper: strip comments + trailing commas so we can json.loads() ---
+#
+def strip_json5_comments_and_trailing_commas(raw_text: str) -> str:
+    # single pass: drop // line comments, /* block */ comments and trailing
+    # commas before } or ], leaving string literals (URLs etc.) intact
+    return _JSON5_SCAN_RE.sub(_json5_keep_strings, raw_text).strip()
+
+#
+# --- Text shaping helpers (your narration rules) ---
+#
+def bullets_to_paragraph(joined_text: str) -> str:
+    """
+    Take bullet text like:
+      - Step one
+      - Step two / do X
+    and flatten into one paragraph:
+      "Step one Step two do X"
+    Rules you asked for:
+    - strip leading "- " / "• "
+    - replace "/" with a space
+    - collapse whitespace
+    - DO NOT add extra wording
+    """
+    words = []
+    for line in joined_text.splitlines():
+        line = line.strip()
+        # strip common bullet prefix
+        if line[:1] in ("-", "•"):
+            line = line[1:]
+        # soften "/" so screen reader voice is nicer;
+        # split() also collapses whitespace in the same pass
+        words.extend(line.replace("/", " ").split())
+    return " ".join(words)
+
+def bullets_to_paragraph_with_title(joined_text: str):
+    """
+    Same paragraph as bullets_to_paragraph(), plus a title guess (the first
+    non-empty line with its bullet marker stripped), from one pass over the
+    lines. Returns (paragraph, title).
+    """
+    words = []
+    title = ""
+    for line in joined_text.splitlines():
+        line = line.strip()
+        if line[:1] in ("-", "•"):
+            line = line[1:]
+        if not title:
+            title = line.lstrip()
+        words.extend(line.replace("/", " ").split())
+    return " ".join(words), title
+
+# pure str -> str, so memoize; repeated boilerplate steps become cache hits
+# (bounded at 1024 entries to keep memory small)
+@functools.lru_cache(maxsize=1024)
+def normalize_whitespace(txt: str) -> str:
+    """
+    Placeholder "8th grade" voice:
+    - keep the user's language
+    - just normalize spaces
+    """
+    txt = txt.strip()
+    txt = _WS_RE.sub(" ", txt)
+    return txt
+
+@functools.lru_cache(maxsize=1024)
+def simplify_sentences_for_grade5(txt: str) -> str:
+    """
+    Original placeholder "5th grade" voice (v2 / v3 copy):
+    - short chunks
+    - cap ~25 words per chunk
+    - join with ". "
+    """
+    parts = _SENT_RE.split(txt)
+    simple_bits = []
+    for p in parts:
+        p = p.strip()
+        if not p:
+            continue
+        short_words = p.split(None, 25)[:25]
+        simple_bits.append(" ".join(short_words))
+    out = ". ".join(simple_bits).strip()
+    if out:
+        out += "."
+    return out
+
+@functools.lru_cache(maxsize=1024)
+def simplify_for_grade5(txt: str) -> str:
+    """
+    Grade 5-ish simplifier for SOP narration (v3worked_b4_addUAP_Oth).
+
+    Strategy:
+    - Normalize punctuation and spacing.
+    - Split into action-like chunks using common verbs / separators.
+    - Clean filler phrases like "From the Service Orders Screen".
+    - Truncate long chunks (~20 words).
+    - Return short, direct, imperative sentences joined with ". ".
+    """
+
+    # normalize punctuation / unicode dashes / bullets
+    t = txt
+    # ("â€”" is a multi-char mojibake sequence, so it still needs a replace)
+    t = t.replace("â€”", "-").translate(_DASH_TABLE)
+    t = _WS_RE.sub(" ", t).strip()
+
+    # insert split markers before common action verbs so we get shorter steps
+    t_marked = _VERB_RE.sub(r"| \1", t)
+
+    # also break on " - " and ". " (common in your input)
+    t_marked = t_marked.replace(" - ", " | ")
+    t_marked = t_marked.replace(". ", " | ")
+
+    # walk the chunks straight off split() -- no intermediate stripped list;
+    # bind append once since this loop runs per chunk on every row and on PM
+    cleaned_steps = []
+    add_step = cleaned_steps.append
+    for chunk in t_marked.split("|"):
+        chunk = chunk.strip()
+        if not chunk:
+            continue
+
+        # remove boilerplate screen intros, UI fluff and UI nouns
+        chunk = _STRIP_RE.sub("", chunk)
+
+        # collapse leftover commas/space
+        chunk = _WS_RE.sub(" ", chunk).strip(" ,.")
+
+        if not chunk:
+            continue
+
+        # cap length ~20 words (maxsplit stops tokenizing after word 20;
+        # the unsplit remainder lands in item 21 and is dropped)
+        words = chunk.split(None, 20)[:20]
+        short = " ".join(words)
+
+        # Capitalize for readability
+        if short:
+            short = short[0].upper() + short[1:]
+
+        add_step(short)
+
+    out = ". ".join(cleaned_steps).strip()
+    if out and not out.endswith("."):
+        out += "."
+    return out
+
+#
+# --- Core row builder that understands Warranty + SRO shapes ---
+#
+def build_rows(narr_data: dict):
+    """
+    Produce ordered list of step dicts:
+
+    [
+      {
+        "opm_step": "P1",
+        "src_file": "Something.xlsx",
+        "title":    "Human title or first bullet line",
+        "step_in":  "flattened bullet text"
+      },
+      ...
+    ]
+
+    Supports:
+    (A) SRO-style:
+        narr_data["files"] = [
+          {"source_file": "...", "joined_text": "..."},
+          ...
+        ]
+        Order = list order.
+
+    (B) Warranty-style:
+        narr_data["sequence_order"] = [ "file1.xlsx", "file2.csv", ...]
+        narr_data["file_titles"][filename] = "Nice title"
+        narr_data["extraction"]["files"] = [
+           {"file": "file1.xlsx", "joined_text": "..."},
+           ...
+        ]
+        Order = sequence_order.
+    """
+
+    rows_ordered = []
+
+    if "files" in narr_data:
+        # SRO-style
+        for idx, fobj in enumerate(narr_data["files"], start=1):
+            filename = (fobj.get("source_file","") or "").strip()
+            # == os.path.basename on POSIX, minus the os.path dispatch
+            base = filename.rpartition("/")[2]
+            joined = (fobj.get("joined_text","") or "").strip()
+
+            # flatten the bullets and guess a Source_Title (first non-empty
+            # bullet-ish line) in the same pass over the lines
+            step_in, title_guess = bullets_to_paragraph_with_title(joined)
+
+            rows_ordered.append({
+                "opm_step": f"P{idx}",
+                "src_file": base,
+                "title": title_guess,
+                "step_in": step_in
+            })
+
+    else:
+        # Warranty-style (json5 schema from make_sop_nar_json_v6)
+        seq = narr_data.get("sequence_order", [])
+        file_titles = narr_data.get("file_titles", {})
+        extraction_files = narr_data.get("extraction", {}).get("files", [])
+
+        # build quick lookup filename -> joined_text
+        joined_lookup = {}
+        for fobj in extraction_files:
+            fname = (fobj.get("file","") or "").strip()
+            joined_lookup[fname] = (fobj.get("joined_text","") or "").strip()
+
+        for idx, fname in enumerate(seq, start=1):
+            joined = joined_lookup.get(fname, "")
+            human_title = file_titles.get(fname, fname)
+            step_in = bullets_to_paragraph(joined)
+
+            rows_ordered.append({
+                "opm_step": f"P{idx}",
+                "src_file": fname,
+                "title": human_title,
+                "step_in": step_in
+            })
+
+    return rows_ordered
+
+#
+# --- CSV output ---
+#
+def serialize_rows(rows) -> str:
+    # rows are tuples already in FIELDNAMES order, so they go straight to
+    # csv.writer; format the whole table in memory once and let callers
+    # write it wherever it goes
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(FIELDNAMES)
+    w.writerows(rows)
+    return buf.getvalue()
+
+def same_as_on_disk(payload: str, out_csv_path) -> bool:
+    # True when out_csv_path already holds exactly this payload
+    # (size check first, so a changed table usually costs one stat)
+    data = payload.encode("utf-8")
+    try:
+        if os.path.getsize(out_csv_path) != len(data):
+            return False
+        with open(out_csv_path, "rb") as f:
+            return f.read() == data
+    except OSError:
+        return False
+
+def write_payload(payload: str, out_csv_path):
+    # 1 MiB buffer: the encoded table goes to the OS in as few write()
+    # calls as possible instead of 8 KiB pieces
+    with open(out_csv_path, "w", encoding="utf-8", newline="",
+              buffering=1 << 20) as f:
+        f.write(payload)
@@ -1,12 +1,19 @@
 
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import argparse, sys, re, logging
+import argparse, sys, logging
 from datetime import datetime
 from pathlib import Path
 import pandas as pd
 from difflib import SequenceMatcher
 
+# rapidfuzz is optional: its C++ cdist scores every (raw, narr) title pair
+# in one call and is only used to rule pairs out before SequenceMatcher
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:
+    process = None
+
 TS_FMT = "%m%d%y_%H%M"  # MMDDYY_HHNN
 
 def ts_now():
@@ -27,7 +34,7 @@ def setup_logger(outdir: Path, sop: str):
     return logger
 
 def read_csv(path: Path):
-    return pd.read_csv(path, encoding="utf-8-sig", engine="python")
+    return pd.read_csv(path, encoding="utf-8-sig")
 
 def write_csv(df: pd.DataFrame, path: Path):
     path.parent.mkdir(parents=True, exist_ok=True)
@@ -35,7 +42,18 @@ def write_csv(df: pd.DataFrame, path: Path):
 
 def normalize_text(s):
     if pd.isna(s): return ""
-    return re.sub(r"\s+", " ", str(s)).strip()
+    # str.split() with no separator splits on whitespace runs and drops
+    # leading/trailing ones: the same result as \s+ -> " " plus strip()
+    return " ".join(str(s).split())
+
+def normalize_col(col: pd.Series) -> pd.Series:
+    # normalize_text over a whole column. Python-backed strings keep \s
+    # Unicode-aware (PPT titles carry \v and NBSPs); Arrow's regex engine
+    # only knows ASCII whitespace.
+    return (col.astype(pd.StringDtype("python"))
+               .str.replace(r"\s+", " ", regex=True)
+               .str.strip()
+               .fillna(""))
 
 def first_nonempty(*vals):
     for v in vals:
@@ -43,19 +61,26 @@ def first_nonempty(*vals):
             return normalize_text(v)
     return ""
 
-def fuzzy_score(a: str, b: str) -> float:
+def bounded_ratio(sm: SequenceMatcher, thresh: float = 0.0) -> float:
+    # cheap upper bounds on ratio() first (lengths only, then character
+    # counts): if either is under thresh the pair can't match, report 0
+    if sm.real_quick_ratio() < thresh or sm.quick_ratio() < thresh:
+        return 0.0
+    return sm.ratio()
+
+def fuzzy_score(a: str, b: str, thresh: float = 0.0) -> float:
     if not a or not b: return 0.0
-    return SequenceMatcher(None, a.lower(), b.lower()).ratio()
+    return bounded_ratio(SequenceMatcher(None, a.lower(), b.lower()), thresh)
 
 def poss_merge(logger, sop, raw_path: Path, narr_path: Path, outdir: Path, thresh: float=0.72):
     logger.info(f"[poss_merge] raw={raw_path} narr={narr_path}")
-    raw = read_csv(raw_path).copy()
-    narr = read_csv(narr_path).copy()
+    raw = read_csv(raw_path)
+    narr = read_csv(narr_path)
 
     for col in ["SelectionTitle","Title","Code","Title_short"]:
-        if col in raw.columns: raw[col] = raw[col].map(normalize_text)
+        if col in raw.columns: raw[col] = normalize_col(raw[col])
     for col in ["OPM_Step","Source_File","Source_Title","Step_narr_in"]:
-        if col in narr.columns: narr[col] = narr[col].map(normalize_text)
+        if col in narr.columns: narr[col] = normalize_col(narr[col])
 
     raw_cols  = ["SelectionTitle","Title","Code","Title_short"]
     narr_cols = ["OPM_Step","Source_File","Source_Title","Step_narr_in"]
@@ -66,10 +91,25 @@ def poss_merge(logger, sop, raw_path: Path, narr_path: Path, outdir: Path, thres
     for c in narr_cols:
         if c not in narr.columns: narr[c] = ""
 
-    narr_list = list(narr[["OPM_Step","Source_Title"]].itertuples(index=False, name=None))
+    narr_opm = narr["OPM_Step"].tolist()
+    narr_title_lc = [str(t).lower() for t in narr["Source_Title"]]
+    # one matcher per narr title: SequenceMatcher indexes its second
+    # sequence once, so per raw row only set_seq1() changes
+    matchers = [SequenceMatcher(None, "", t) for t in narr_title_lc]
+
+    # rapidfuzz's ratio counts the longest common subsequence, which is never
+    # shorter than the matching blocks SequenceMatcher finds, so its score is
+    # an upper bound on fuzzy_score. Pairs it puts under the threshold can't
+    # match; only the rest are scored with SequenceMatcher as before.
+    candidates = None
+    if process is not None and narr_title_lc:
+        queries = [first_nonempty(t, ts).lower() for t, ts in zip(raw["Title"], raw["Title_short"])]
+        cutoff = thresh * 100 - 1e-6  # slack for float rounding
+        scores = process.cdist(queries, narr_title_lc, scorer=fuzz.ratio, workers=-1)
+        candidates = [(row >= cutoff).nonzero()[0] for row in scores]
 
     rows = []
-    for _, r in raw.iterrows():
+    for i, (_, r) in enumerate(raw.iterrows()):
         row = {c: "" for c in raw_cols + narr_cols + extra_cols}
         for c in raw_cols: row[c] = r.get(c, "")
         code = normalize_text(r.get("Code",""))
@@ -83,10 +123,15 @@ def poss_merge(logger, sop, raw_path: Path, narr_path: Path, outdir: Path, thres
             q = first_nonempty(title, tshort)
             best = (0.0, "")
             if q:
-                for opm, stitle in narr_list:
-                    sc = fuzzy_score(q, stitle)
+                q_lc = q.lower()
+                for j in (range(len(matchers)) if candidates is None else candidates[i]):
+                    if not narr_title_lc[j]:
+                        continue
+                    sm = matchers[j]
+                    sm.set_seq1(q_lc)
+                    sc = bounded_ratio(sm, thresh)
                     if sc > best[0]:
-                        best = (sc, opm)
+                        best = (sc, narr_opm[j])
                 if best[0] >= thresh:
                     suggest_step = best[1]
                     suggest_conf = f"{best[0]:.3f}"
@@ -107,22 +152,24 @@ def poss_merge(logger, sop, raw_path: Path, narr_path: Path, outdir: Path, thres
 
 def premerge(logger, sop, raw_path: Path, narr_path: Path, resp_poss_merge_path: Path, outdir: Path):
     logger.info(f"[premerge] raw={raw_path} narr={narr_path} resp={resp_poss_merge_path}")
-    raw = read_csv(raw_path).copy()
-    narr = read_csv(narr_path).copy()
-    resp = read_csv(resp_poss_merge_path).copy()
+    raw = read_csv(raw_path)
+    narr = read_csv(narr_path)
+    resp = read_csv(resp_poss_merge_path)
 
     for df in (raw, resp):
         for c in ["Code","Title","Title_short"]:
-            if c in df.columns: df[c] = df[c].map(normalize_text)
+            if c in df.columns: df[c] = normalize_col(df[c])
 
     for c in ["OPM_Step","Source_File","Source_Title","Step_narr_in","Step_narr_out_simple","Step_narr_out","Step_narr_m_out_simple","Step_narr_m_out"]:
-        if c in narr.columns: narr[c] = narr[c].map(normalize_text)
+        if c in narr.columns: narr[c] = normalize_col(narr[c])
 
-    narr_by_step = {}
-    for _, n in narr.iterrows():
-        k = normalize_text(n.get("OPM_Step",""))
-        if k and k not in narr_by_step:
-            narr_by_step[k] = n
+    # first narr row per (non-blank) OPM_Step, indexed by step
+    if "OPM_Step" in narr.columns:
+        narr_by_step = (narr[narr["OPM_Step"] != ""]
+                        .drop_duplicates(subset="OPM_Step", keep="first")
+                        .set_index("OPM_Step"))
+    else:
+        narr_by_step = pd.DataFrame()
 
     mapping = {}
     if "Code-OPM_S" in resp.columns:
@@ -134,14 +181,25 @@ def premerge(logger, sop, raw_path: Path, narr_path: Path, resp_poss_merge_path:
             if code:
                 mapping.setdefault(code, {})[title] = opm
 
-    out = raw.copy()
+    out = raw  # raw isn't used again below
     for col in ["Narr1","Narr2","Narr3","OPM_Step","Source_Title_used"]:
         if col not in out.columns: out[col] = ""
 
+    # results go into per-column lists (starting from what is already there,
+    # so unmapped rows keep their values) and are assigned back once at the end
+    n = len(out)
+    codes = out["Code"].tolist() if "Code" in out.columns else [""] * n
+    titles = out["Title"].tolist() if "Title" in out.columns else [""] * n
+    opm_col = out["OPM_Step"].tolist()
+    src_col = out["Source_Title_used"].tolist()
+    narr1_col = out["Narr1"].tolist()
+    narr2_col = out["Narr2"].tolist()
+    narr3_col = out["Narr3"].tolist()
+
     miss_map, used_map = 0, 0
-    for idx, r in out.iterrows():
-        code = normalize_text(r.get("Code",""))
-        title = normalize_text(r.get("Title",""))
+    for i, (code, title) in enumerate(zip(codes, titles)):
+        code = normalize_text(code)
+        title = normalize_text(title)
         opm = ""
         if code in mapping:
             opm = mapping[code].get(title) or next(iter(mapping[code].values()), "")
@@ -152,11 +210,11 @@ def premerge(logger, sop, raw_path: Path, narr_path: Path, resp_poss_merge_path:
         if opm == "PM":
             src_title = "PM-selected"
             narr1 = src_title
-            nrow = narr_by_step.get(opm)
+            nrow = narr_by_step.loc[opm] if opm in narr_by_step.index else None
             narr2 = normalize_text(nrow.get("Step_narr_m_out_simple","")) if nrow is not None else ""
             narr3 = normalize_text(nrow.get("Step_narr_m_out","")) if nrow is not None else ""
         else:
-            nrow = narr_by_step.get(opm)
+            nrow = narr_by_step.loc[opm] if opm in narr_by_step.index else None
             if nrow is None:
                 logger.warning(f"[premerge] No narr row for OPM_Step='{opm}' (Code={code}, Title={title})")
                 miss_map += 1
@@ -166,13 +224,19 @@ def premerge(logger, sop, raw_path: Path, narr_path: Path, resp_poss_merge_path:
             narr2 = normalize_text(nrow.get("Step_narr_out_simple",""))
             narr3 = normalize_text(nrow.get("Step_narr_out",""))
 
-        out.at[idx, "OPM_Step"] = opm
-        out.at[idx, "Source_Title_used"] = src_title
-        out.at[idx, "Narr1"] = narr1
-        out.at[idx, "Narr2"] = narr2
-        out.at[idx, "Narr3"] = narr3
+        opm_col[i] = opm
+        src_col[i] = src_title
+        narr1_col[i] = narr1
+        narr2_col[i] = narr2
+        narr3_col[i] = narr3
         used_map += 1
 
+    out["OPM_Step"] = opm_col
+    out["Source_Title_used"] = src_col
+    out["Narr1"] = narr1_col
+    out["Narr2"] = narr2_col
+    out["Narr3"] = narr3_col
+
     out_path = outdir / f"{sop}_PreMerge_{ts_now()}.csv"
     write_csv(out, out_path)
     logger.info(f"[premerge] wrote -> {out_path}; mapped={used_map}, unmapped={miss_map}")
@@ -180,7 +244,7 @@ def premerge(logger, sop, raw_path: Path, narr_path: Path, resp_poss_merge_path:
 
 def tw_mk_in(logger, sop, premerge_path: Path, outdir: Path):
     logger.info(f"[tw_mk_in] premerge={premerge_path}")
-    df = read_csv(premerge_path).copy()
+    df = read_csv(premerge_path)
 
     if "Source_Title" not in df.columns and "Source_Title_used" in df.columns:
         df["Source_Title"] = df["Source_Title_used"]
@@ -192,9 +256,8 @@ def tw_mk_in(logger, sop, premerge_path: Path, outdir: Path):
         "UAP url","UAP Label","start_here","Mismatch"
     ]
 
-    out = pd.DataFrame()
-    for c in cols:
-        out[c] = df[c] if c in df.columns else ""
+    # columns the PreMerge file doesn't have come out blank
+    out = df.reindex(columns=cols, fill_value="")
 
     out_path = outdir / f"{sop}_mk_tw_in_{ts_now()}.csv"
     write_csv(out, out_path)
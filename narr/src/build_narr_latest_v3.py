@@ -9,45 +9,57 @@
 #       --sop "LineEnt" \
 #       --out-dir "/workspaces/EdxBuild/narr/Outputs/LineEnt"
 #
-import argparse, json, csv, re, os
+import argparse, json, csv, re, os, functools, mmap, io
+from operator import itemgetter
 from datetime import datetime, timedelta
 
+# patterns used per line / per step, compiled once
+_BULLET_RE = re.compile(r"^[\-•]\s*")
+_SENT_RE = re.compile(r"[.!?]+")
+# a whole "// ..." line, newline included, so the line numbers json.loads
+# reports for the rest of the text stay the same (bytes: see load_json5)
+_COMMENT_RE = re.compile(rb"^[^\S\n]*//[^\n]*(?:\n|\Z)", re.M)
+
 # ---------- helper: cut off tail config block (invalid JSON5 keys) ----------
-def trim_after_config_block(full_text: str) -> str:
-    marker = "===== BEGIN DEFAULT NARR CONFIG"
+def trim_after_config_block(full_text) -> bytes:
+    # full_text: bytes or an mmap of the file; only the kept part is copied
+    marker = b"===== BEGIN DEFAULT NARR CONFIG"
     idx = full_text.find(marker)
     if idx == -1:
-        return full_text
+        return full_text[:]
 
     kept = full_text[:idx]
 
-    kept = kept.rstrip(", \n\r\t")
+    kept = kept.rstrip(b", \n\r\t")
 
-    if not kept.rstrip().endswith("}"):
-        return full_text
+    if not kept.rstrip().endswith(b"}"):
+        return full_text[:]
 
-    return kept + "\n}\n"
+    return kept + b"\n}\n"
 
 # ---------- helpers for JSON5-ish to JSON ----------
-def strip_json5_comments(text: str) -> str:
-    out_lines = []
-    for line in text.splitlines():
-        s = line.strip()
-        if s.startswith("//"):
-            continue
-        out_lines.append(line)
-    return "\n".join(out_lines)
+def strip_json5_comments(text: bytes) -> bytes:
+    return _COMMENT_RE.sub(b"", text)
 
 def load_json5(path: str) -> dict:
-    raw = open(path, "r", encoding="utf-8").read()
-    raw = trim_after_config_block(raw)
+    # Work on the raw UTF-8 bytes: the file is mapped rather than read and
+    # decoded, the marker search runs on the mapping so the config tail is
+    # never copied, and json.loads() decodes the bytes itself.
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raw = b""  # mmap can't map an empty file
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                raw = trim_after_config_block(mm)
     raw = strip_json5_comments(raw)
     return json.loads(raw)
 
 # ---------- text shaping helpers ----------
+@functools.lru_cache(maxsize=4096)
 def normalize_whitespace(s: str) -> str:
-    return re.sub(r"\s+", " ", s or "").strip()
+    return " ".join((s or "").split())
 
+@functools.lru_cache(maxsize=4096)
 def simplify_for_grade5(text: str) -> str:
     """
     Heuristic: turn long bullet text into shorter "do this" steps
@@ -61,10 +73,10 @@ def simplify_for_grade5(text: str) -> str:
 
     for ln in lines:
         # strip leading bullet marks
-        ln = re.sub(r"^[\-•]\s*", "", ln)
+        ln = _BULLET_RE.sub("", ln)
 
         # split on sentence enders, keep first clause
-        parts = re.split(r"[.!?]+", ln)
+        parts = _SENT_RE.split(ln)
         chunk = parts[0].strip() if parts else ""
         if not chunk:
             continue
@@ -110,7 +122,7 @@ def build_rows(narr_data: dict):
 
             # guess title from first non-empty bullet
             for line in joined.splitlines():
-                tline = re.sub(r"^[-•]\s*", "", line.strip())
+                tline = _BULLET_RE.sub("", line.strip())
                 if tline:
                     title_guess = tline
                     break
@@ -165,12 +177,13 @@ def build_rows(narr_data: dict):
 
     return rows_ordered
 
+@functools.lru_cache(maxsize=4096)
 def bullets_to_paragraph(joined: str) -> str:
     if not joined:
         return ""
     lines = []
     for ln in joined.splitlines():
-        ln = re.sub(r"^[\-•]\s*", "", ln.strip())
+        ln = _BULLET_RE.sub("", ln.strip())
         if ln:
             lines.append(ln)
     return " ".join(lines)
@@ -197,7 +210,7 @@ def build_narr_latest(narr_data: dict, sop_name: str):
     ordered_steps = build_rows(narr_data)
 
     final_rows = []
-    all_step_in = []
+    all_out_8 = []
 
     # P rows
     for step in ordered_steps:
@@ -233,12 +246,17 @@ def build_narr_latest(narr_data: dict, sop_name: str):
             "UAP Label": uap_label,
         })
 
-        if step_in:
-            all_step_in.append(step_in)
+        if out_8:
+            all_out_8.append(out_8)
 
     # PM row (overview row)
-    mega = " ".join(all_step_in)
-    mega = re.sub(r"\s+", " ", mega).strip()
+    # joining the already-normalized step texts gives the same mega text as
+    # collapsing whitespace over the joined raw step_in values
+    mega = " ".join(all_out_8)
+    # mega is a single line, and simplify_for_grade5 keeps only the first
+    # sentence of a line, so it only needs the text up to the first . ! ?
+    m = _SENT_RE.search(mega)
+    mega_simple = simplify_for_grade5(mega[:m.start()] if m else mega)
 
     final_rows.append({
         "OPM_Step": "PM",
@@ -248,8 +266,8 @@ def build_narr_latest(narr_data: dict, sop_name: str):
         "Step_narr_m_in": mega,
         "Step_narr_out": "",
         "Step_narr_out_simple": "",
-        "Step_narr_m_out": normalize_whitespace(mega),
-        "Step_narr_m_out_simple": simplify_for_grade5(mega),
+        "Step_narr_m_out": mega,
+        "Step_narr_m_out_simple": mega_simple,
         "Step_Code": "",
         "Oth1": "",
         "Oth2": "",
@@ -259,28 +277,37 @@ def build_narr_latest(narr_data: dict, sop_name: str):
 
     return final_rows
 
-def write_csv(rows, out_csv_path):
-    fieldnames = [
-        "OPM_Step",
-        "Source_File",
-        "Source_Title",
-        "Step_narr_in",
-        "Step_narr_m_in",
-        "Step_narr_out",
-        "Step_narr_out_simple",
-        "Step_narr_m_out",
-        "Step_narr_m_out_simple",
-        "Step_Code",
-        "Oth1",
-        "Oth2",
-        "UAP url",
-        "UAP Label",
-    ]
+FIELDNAMES = [
+    "OPM_Step",
+    "Source_File",
+    "Source_Title",
+    "Step_narr_in",
+    "Step_narr_m_in",
+    "Step_narr_out",
+    "Step_narr_out_simple",
+    "Step_narr_m_out",
+    "Step_narr_m_out_simple",
+    "Step_Code",
+    "Oth1",
+    "Oth2",
+    "UAP url",
+    "UAP Label",
+]
+_ROW_VALUES = itemgetter(*FIELDNAMES)
+
+def serialize_csv(rows) -> str:
+    # the whole table formatted once in memory (main() writes the same text
+    # to both output files); itemgetter pulls each row's values out in
+    # FIELDNAMES order instead of DictWriter's per-row dict handling
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(FIELDNAMES)
+    w.writerows(map(_ROW_VALUES, rows))
+    return buf.getvalue()
+
+def write_csv(payload: str, out_csv_path):
     with open(out_csv_path, "w", encoding="utf-8", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames)
-        w.writeheader()
-        for r in rows:
-            w.writerow(r)
+        f.write(payload)
 
 def main():
     ap = argparse.ArgumentParser()
@@ -300,8 +327,9 @@ def main():
     out_ts = os.path.join(args.out_dir, f"{args.sop}_narr_latest_{ts}.csv")
     out_latest = os.path.join(args.out_dir, f"{args.sop}_narr_latest.csv")
 
-    write_csv(rows, out_ts)
-    write_csv(rows, out_latest)
+    payload = serialize_csv(rows)
+    write_csv(payload, out_ts)
+    write_csv(payload, out_latest)
 
     print(f"Wrote {out_ts}")
     print(f"Wrote {out_latest}")
@@ -22,23 +22,34 @@ from pathlib import Path
 from typing import Tuple, Optional
 
 
+# Patterns rewritten by build_player_html(), compiled once at import
+_TITLE_RE = re.compile(r"<title>.*?</title>", re.S)
+_STORY_RE = re.compile(r'(<input id="story"[^>]*\bvalue=")[^"]*(")')
+_GOENT_RE = re.compile(
+    r'(function goEntityMenu\(\)\s*\{[^}]*window\.location\.href\s*=\s*")[^"]*(";\s*[^}]*\})',
+    re.S,
+)
+
+
 def infer_identity_from_ready(ready_path: Path) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]:
     """
     Look into the READY CSV and infer Entity, Function, SubEntity, SOP_id.
     We only need one representative row; all rows should share these fields.
     """
-    entity = function = subentity = sop_id = None
+    fields = ("Entity", "Function", "SubEntity", "SOP_id")
     with ready_path.open(newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
+        reader = csv.reader(f)
+        header = next(reader, None) or []
+        # plain rows indexed by position: no dict is built per row, and a
+        # repeated header name resolves to its last column like DictReader
+        pos = {name: i for i, name in enumerate(header)}
+        idx = [pos.get(name) for name in fields]
         for row in reader:
-            entity = (row.get("Entity") or "").strip() or entity
-            function = (row.get("Function") or "").strip() or function
-            subentity = (row.get("SubEntity") or "").strip() or subentity
-            sop_id = (row.get("SOP_id") or "").strip() or sop_id
-            # stop after first non-empty set
-            if entity or function or subentity or sop_id:
-                break
-    return entity, function, subentity, sop_id
+            vals = [row[i].strip() if i is not None and i < len(row) else "" for i in idx]
+            # stop at the first row with any of the fields set
+            if any(vals):
+                return tuple(v or None for v in vals)
+    return None, None, None, None
 
 
 def infer_anchor_id(entity: Optional[str], function: Optional[str]) -> str:
@@ -71,31 +82,17 @@ def build_player_html(template_text: str, title: str, story_rel: str, anchor_id:
     story_val = "/" + story_rel.lstrip("/")
     entity_href_norm = f"/EdxBuild/index.html#{anchor_id}"
 
+    # Replacements are functions so that backslashes in the title or paths
+    # are written literally instead of being read as group references.
+
     # 1) Replace <title>...</title>
-    out = re.sub(
-        r"<title>.*?</title>",
-        f"<title>{title}</title>",
-        template_text,
-        count=1,
-        flags=re.S,
-    )
+    out = _TITLE_RE.sub(lambda m: f"<title>{title}</title>", template_text, count=1)
 
     # 2) Replace value="..." on <input id="story" ...>
-    out = re.sub(
-        r'(<input id="story"[^>]*\\bvalue=")[^"]*(")',
-        r'\\1' + story_val + r'\\2',
-        out,
-        count=1,
-    )
+    out = _STORY_RE.sub(lambda m: m.group(1) + story_val + m.group(2), out, count=1)
 
     # 3) Replace window.location.href inside goEntityMenu()
-    out = re.sub(
-        r'(function goEntityMenu\\(\\)\\s*\\{[^}]*window\\.location\\.href\\s*=\\s*")[^"]*(";\\s*[^}]*\\})',
-        r'\\1' + entity_href_norm + r'\\2',
-        out,
-        count=1,
-        flags=re.S,
-    )
+    out = _GOENT_RE.sub(lambda m: m.group(1) + entity_href_norm + m.group(2), out, count=1)
 
     return out
 
@@ -11,20 +11,28 @@ Options:
   --out      Where to write the CSV report. If omitted, prints only to console.
   --max-rows Limit rows read from each sheet when profiling columns (default: 200)
 """
-import argparse, glob, os, re, sys
+import argparse, glob, importlib.util, os, re, sys
 from pathlib import Path
 from typing import List
 import pandas as pd
 
+# Excel engine: python-calamine (Rust, several times faster than openpyxl's
+# XML parsing) when it is installed, else openpyxl
+XL_READ_KW = {"engine": "calamine" if importlib.util.find_spec("python_calamine") else "openpyxl"}
+
 KEYWORDS = ["what","detail","step","notes","action","description","instruction"]
 
 def suggest_text_columns(df: pd.DataFrame) -> List[str]:
+    # stringify the sheet once, then average each column's length over its
+    # non-blank cells in one frame-wide pass
+    text = df.astype(str).fillna("")
+    # (astype: apply hands a row-less frame back unchanged, still as strings)
+    lens = text.apply(lambda s: s.str.len()).astype(float)
+    nonblank = text.apply(lambda s: s.str.strip() != "").astype(bool)
+    avg_lens = lens.where(nonblank).mean().fillna(0)
     suggestions = []
-    for c in df.columns:
+    for c, avg_len in zip(df.columns, avg_lens):
         cn = str(c).strip()
-        series = df[c].astype(str).fillna("")
-        nonempty = series[series.str.strip()!=""]
-        avg_len = nonempty.str.len().mean() if len(nonempty) else 0
         hits_kw = any(k in cn.lower() for k in KEYWORDS)
         if hits_kw or avg_len >= 10:
             suggestions.append(cn)
@@ -45,7 +53,7 @@ def main():
     rows = []
     for f in files:
         try:
-            xlf = pd.ExcelFile(f)
+            xlf = pd.ExcelFile(f, **XL_READ_KW)
             sheets = list(xlf.sheet_names)
         except Exception as e:
             print(f"[WARN] Cannot open {os.path.basename(f)}: {e}")
@@ -64,9 +72,11 @@ def main():
         print(f"Sheets: {', '.join(sheets)}")
         print(f"Recommended default sheet: {recommended}")
 
+        # parse every sheet from the workbook already opened above, rather
+        # than re-reading the file (zip + shared strings) once per sheet
         for s in sheets:
             try:
-                df = pd.read_excel(f, sheet_name=s, dtype=str, nrows=args.max_rows)
+                df = xlf.parse(s, dtype=str, nrows=args.max_rows)
             except Exception as e:
                 print(f"  - {s}: cannot read: {e}")
                 continue
@@ -84,6 +94,7 @@ def main():
                 "Suggested_Text_Columns": "; ".join(sug),
                 "Rows_Profiled": len(df),
             })
+        xlf.close()
 
     if args.out:
         outp = Path(args.out)
@@ -4,24 +4,37 @@
 # Output XLSX only with tabs: Transi, Log, Unmatched_RAW, Unused_NARR.
 # Defaults reflect /workspaces/son_e_lum layout; everything can be overridden via CLI.
 
-import os, re, math, glob, argparse, sys
+import os, re, math, glob, fnmatch, functools, argparse, sys
 import pandas as pd
 from datetime import datetime
 from difflib import SequenceMatcher
 import pytz
 
+# rapidfuzz is optional: its C++ cdist scores every RAW x NARR title pair in
+# one call and is only used to rule pairs out before SequenceMatcher
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:
+    process = None
+
 def ny_timestamp():
     ny = pytz.timezone("America/New_York")
     return datetime.now(ny).strftime("%d%m%y_%H%M")
 
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_WS_RE = re.compile(r"\s+")
+
+# cached: RAW and NARR titles repeat, and each distinct one only needs the
+# two regex passes once (typed: 1 and True must not share an entry)
+@functools.lru_cache(maxsize=4096, typed=True)
 def normalize(s: str) -> str:
     """Lowercase, strip, remove underscores & hyphens, strip punctuation, collapse whitespace."""
     if s is None:
         s = ""
     s = str(s).lower().strip()
     s = s.replace("_", " ").replace("-", " ")
-    s = re.sub(r"[^\w\s]", " ", s)  # strip punctuation
-    s = re.sub(r"\s+", " ", s).strip()
+    s = _PUNCT_RE.sub(" ", s)  # strip punctuation
+    s = _WS_RE.sub(" ", s).strip()
     return s
 
 def ratio(a, b) -> float:
@@ -43,20 +56,33 @@ def load_narr(path, sheet=0) -> pd.DataFrame:
 
 def discover_narr_file(narr_dir: str) -> str:
     """Find narration file in directory, preferring *_latest.csv, else a likely Narr file by recency."""
-    cand = sorted(glob.glob(os.path.join(narr_dir, "*_latest.csv")))
+    # one directory listing matched against each pattern the way glob would
+    # (hidden entries skipped); DirEntry.stat() reuses what scandir fetched
+    try:
+        with os.scandir(narr_dir or os.curdir) as it:
+            entries = [e for e in it if not e.name.startswith(".")]
+    except OSError:
+        entries = []
+
+    def matching(*patterns):
+        return [e for p in patterns for e in entries if fnmatch.fnmatch(e.name, p)]
+
+    def newest(cands):
+        cands.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+        return os.path.join(narr_dir, cands[0].name)
+
+    cand = sorted(os.path.join(narr_dir, e.name) for e in matching("*_latest.csv"))
     if cand:
         return cand[0]
-    cand = sorted(glob.glob(os.path.join(narr_dir, "*_Narr_latest.*")))
+    cand = sorted(os.path.join(narr_dir, e.name) for e in matching("*_Narr_latest.*"))
     if cand:
         return cand[0]
-    cands = glob.glob(os.path.join(narr_dir, "*_Narr_*.xlsx")) + glob.glob(os.path.join(narr_dir, "*_Narr_*.csv"))
+    cands = matching("*_Narr_*.xlsx", "*_Narr_*.csv")
     if cands:
-        cands.sort(key=lambda p: os.path.getmtime(p), reverse=True)
-        return cands[0]
-    anyc = glob.glob(os.path.join(narr_dir, "*.xlsx")) + glob.glob(os.path.join(narr_dir, "*.csv"))
+        return newest(cands)
+    anyc = matching("*.xlsx", "*.csv")
     if anyc:
-        anyc.sort(key=lambda p: os.path.getmtime(p), reverse=True)
-        return anyc[0]
+        return newest(anyc)
     raise FileNotFoundError(f"No narration file found in {narr_dir}")
 
 def ensure_cols(df: pd.DataFrame, cols):
@@ -83,36 +109,71 @@ def build_transi(df_raw, df_narr, thresh=0.80, narr_prefixes=("OPM_", "Step_")):
 
     narr_candidates = list(df_narr["OPM_Step"].astype(str).items())
 
+    # normalize every title once up front rather than inside ratio() for each
+    # pair, and keep one SequenceMatcher per NARR title: its b2j index of that
+    # title is built once and reused, only the RAW side changes (set_seq1)
+    raw_norm = [normalize(t) for t in df_out["Title"]] if "Title" in df_out.columns else [""] * len(df_out)
+    narr_norm = [normalize(t) for _, t in narr_candidates]
+    narr_sms = [SequenceMatcher(None, "", t) for t in narr_norm]
+
+    # rapidfuzz's ratio counts the longest common subsequence, which is never
+    # shorter than the matching blocks SequenceMatcher finds, so its score is
+    # an upper bound on ratio(). Pairs it puts under the threshold can't match;
+    # only the rest are scored with SequenceMatcher as before.
+    shortlist = None
+    if process is not None and narr_candidates:
+        scores = process.cdist(raw_norm, narr_norm, scorer=fuzz.ratio, workers=-1)
+        # scores come back as float32; leave a margin so rounding can't drop
+        # a pair sitting exactly on the threshold
+        cutoff = thresh * 100 - 0.01
+        shortlist = [(row >= cutoff).nonzero()[0] for row in scores]
+
     used_narr_indices = set()
     unmatched_rows = []
+    # row positions to flag / fill, collected here and written back
+    # one column at a time after the loop
+    flag_pos = []
+    match_pos, match_narr, match_conf = [], [], []
 
-    for i, r in df_out.iterrows():
+    for pos, (i, r) in enumerate(df_out.iterrows()):
         raw_title = r.get("Title", "")
         if not str(raw_title).strip():
-            df_out.at[i, "Review_Flag"] = "Y"
+            flag_pos.append(pos)
             unmatched_rows.append({"raw_index": i, "Title": r.get("Title",""), "SelectionTitle": r.get("SelectionTitle","")})
             continue
 
-        best_idx, best_text, best_r = None, "", 0.0
-        for j, t in narr_candidates:
-            s = ratio(raw_title, t)
+        best_k, best_idx, best_text, best_r = None, None, "", 0.0
+        cand_pos = range(len(narr_candidates)) if shortlist is None else shortlist[pos]
+        for k in cand_pos:
+            j, t = narr_candidates[k]
+            sm = narr_sms[k]
+            sm.set_seq1(raw_norm[pos])
+            s = sm.ratio()
             if s > best_r:
-                best_r, best_idx, best_text = s, j, t
+                best_r, best_k, best_idx, best_text = s, k, j, t
 
         if best_idx is None or best_r < thresh:
-            df_out.at[i, "Review_Flag"] = "Y"
+            flag_pos.append(pos)
             unmatched_rows.append({"raw_index": i, "Title": r.get("Title",""), "SelectionTitle": r.get("SelectionTitle","")})
             continue
 
-        narr_row = df_narr.loc[best_idx]
+        match_pos.append(pos)
+        match_narr.append(best_k)
+        match_conf.append(str(int(math.ceil(best_r * 100))))
+        used_narr_indices.add(best_idx)
 
-        df_out.at[i, "Source_Title"] = narr_row.get("OPM_Step", "")
-        df_out.at[i, "Merge_OPM"] = narr_row.get("Code", "")
-        df_out.at[i, "Match_Conf"] = str(int(math.ceil(best_r * 100)))
+    if flag_pos:
+        df_out.iloc[flag_pos, df_out.columns.get_loc("Review_Flag")] = "Y"
+    if match_pos:
+        updates = {
+            "Source_Title": df_narr["OPM_Step"].to_numpy()[match_narr],
+            "Merge_OPM": df_narr["Code"].to_numpy()[match_narr],
+            "Match_Conf": match_conf,
+        }
         for col in append_cols:
-            df_out.at[i, col] = narr_row.get(col, "")
-
-        used_narr_indices.add(best_idx)
+            updates[col] = df_narr[col].to_numpy()[match_narr]
+        for col, vals in updates.items():
+            df_out.iloc[match_pos, df_out.columns.get_loc(col)] = vals
 
     unused_mask = ~df_narr.index.isin(list(used_narr_indices))
     df_unused_narr = df_narr.loc[unused_mask].copy()
@@ -175,17 +236,22 @@ def main():
         os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
         out_xlsx = out_path
 
+    # xlsxwriter's constant_memory mode is not an option here: it only keeps
+    # the current row, and to_excel writes the body column by column, so
+    # every column but the last would come out blank
+    unmatched_mask = df_final["Source_Title"] == ""
+    n_unmatched = int(unmatched_mask.sum())
     with pd.ExcelWriter(out_xlsx, engine="xlsxwriter") as writer:
         df_final.to_excel(writer, index=False, sheet_name="Transi")
         summary = pd.DataFrame([{
             "raw_rows": len(df_final),
-            "matched_rows": int(len(df_final) - int((df_final["Source_Title"] == "").sum())),
-            "unmatched_rows": int((df_final["Source_Title"] == "").sum()),
+            "matched_rows": int(len(df_final) - n_unmatched),
+            "unmatched_rows": n_unmatched,
             "unused_narr_rows": int(meta["unused_mask"].sum()),
             "threshold": args.thresh
         }])
         summary.to_excel(writer, index=False, sheet_name="Log")
-        unmatched = df_final[df_final["Source_Title"] == ""][["Code","Title"]] if "Code" in df_final.columns else df_final[df_final["Source_Title"] == ""][["Title"]]
+        unmatched = df_final.loc[unmatched_mask, ["Code","Title"] if "Code" in df_final.columns else ["Title"]]
         unmatched.to_excel(writer, index=False, sheet_name="Unmatched_RAW")
         df_unused_narr.to_excel(writer, index=False, sheet_name="Unused_NARR")
 
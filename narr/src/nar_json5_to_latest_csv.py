@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 import csv, json, argparse, os, re, sys
 
+_COMMENT_RE = re.compile(r'"(?:\\.|[^"\\])*"|/\*.*?\*/|//[^\n]*', re.S)
+
 def load_json5(path):
     """
     Minimal JSON5 loader:
@@ -9,18 +11,9 @@ def load_json5(path):
     Then parses as JSON.
     """
     with open(path, encoding="utf-8") as f:
-        txt = f.read()
-
-    # remove /* ... */ block comments
-    txt = re.sub(r"/\*.*?\*/", "", txt, flags=re.S)
-
-    # strip // comments from each line
-    cleaned_lines = []
-    for line in txt.splitlines():
-        if "//" in line:
-            line = line.split("//", 1)[0]
-        cleaned_lines.append(line)
-    txt = "\n".join(cleaned_lines)
+        # one pass drops both comment kinds; string literals are matched
+        # first and kept, so "//" or "/*" inside a value survives
+        txt = _COMMENT_RE.sub(lambda m: m.group(0) if m.group(0)[0] == '"' else "", f.read())
 
     try:
         return json.loads(txt)
@@ -81,7 +74,9 @@ def main():
     os.makedirs(os.path.dirname(args.out_csv), exist_ok=True)
 
     # The header order below matches what downstream expects (Code, Narr1, Narr2, Narr3, UAP url, UAP Label).
-    with open(args.out_csv, "w", newline="", encoding="utf-8") as f:
+    # 1 MiB buffer: the rows reach the OS in a few large write() calls
+    # rather than 8 KiB pieces
+    with open(args.out_csv, "w", newline="", encoding="utf-8", buffering=1 << 20) as f:
         writer = csv.DictWriter(
             f,
             fieldnames=["Code", "Narr1", "Narr2", "Narr3", "UAP url", "UAP Label"]